@@ -0,0 +1,182 @@
+from aboveboard.bitboard import (
+    DIRECTION_INCS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, square_index
+)
+from aboveboard.eval import (
+    CENTER_CONTROL_FACTORS, CENTER_CONTROL_LEVELS, CENTER_CONTROL_POINTS,
+    MATERIAL_WEIGHT, POSITION_WEIGHT, CENTER_CONTROL_WEIGHT
+)
+from aboveboard.game import Game
+from aboveboard.piece import King, Queen, Rook, Bishop, Knight, Pawn, PieceColor
+from aboveboard.points import MATERIAL_POINTS, POSITION_POINTS
+from typing import Iterable
+
+# NumPy is only needed by the batch evaluation, so it is optional.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Batch evaluation of many positions at once (i.e. for offline analysis),
+# with the same results as the evaluation functions of eval.py. Positions
+# are encoded as piece planes: an (N, 12, 64) array where plane p of
+# position n has a 1 on each square with a piece of PLANE_PIECES[p].
+
+PLANE_PIECES = [
+    (piece_type, color)
+    for color in [PieceColor.WHITE, PieceColor.BLACK]
+    for piece_type in [King, Queen, Rook, Bishop, Knight, Pawn]
+]
+SLIDER_DIRECTIONS = {
+    Rook: ROOK_DIRECTIONS,
+    Bishop: BISHOP_DIRECTIONS,
+    Queen: ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+}
+
+
+def _require_numpy() -> None:
+    if numpy is None:
+        raise Exception("Batch evaluation requires NumPy.")
+
+
+def _get_attacks_points(attacks: int) -> int:
+    # Center control points of a set of squares (see _get_center_control_points).
+    return sum((attacks & level).bit_count() for level in CENTER_CONTROL_LEVELS)
+
+
+def _build_ray_squares() -> list:
+    # Squares of the ray of each direction from each square, closest first,
+    # padded with 64 (a square with no points, always occupied) up to 7.
+    ray_squares = []
+    for file_inc, rank_inc in DIRECTION_INCS:
+        direction_squares = []
+        for index in range(64):
+            file, rank = index % 8 + file_inc, index // 8 + rank_inc
+            squares = []
+            while 0 <= file < 8 and 0 <= rank < 8:
+                squares.append(square_index(file, rank))
+                file, rank = file + file_inc, rank + rank_inc
+            direction_squares.append(squares + [64] * (7 - len(squares)))
+        ray_squares.append(direction_squares)
+    return ray_squares
+
+
+RAY_SQUARES = _build_ray_squares()
+# Center control points of each square, plus the padding one.
+SQUARE_POINTS = [CENTER_CONTROL_POINTS[index // 8][index % 8] for index in range(64)] + [0]
+# Center control points of the attacks of pieces that do not slide, by square.
+STEP_ATTACKS_POINTS = {
+    (King, color): [_get_attacks_points(attacks) for attacks in KING_ATTACKS]
+    for color in [PieceColor.WHITE, PieceColor.BLACK]
+}
+STEP_ATTACKS_POINTS.update({
+    (Knight, color): [_get_attacks_points(attacks) for attacks in KNIGHT_ATTACKS]
+    for color in [PieceColor.WHITE, PieceColor.BLACK]
+})
+STEP_ATTACKS_POINTS.update({
+    (Pawn, color): [_get_attacks_points(attacks) for attacks in PAWN_ATTACKS[color]]
+    for color in [PieceColor.WHITE, PieceColor.BLACK]
+})
+
+
+def encode_positions(games: Iterable[Game]) -> "numpy.ndarray":
+    """
+    Returns the piece planes of the current positions of the games,
+    as an (N, 12, 64) array of uint8.
+    """
+    _require_numpy()
+    bitboards = numpy.array(
+        [[game.board.get_bitboard(piece_type, color) for piece_type, color in PLANE_PIECES] for game in games],
+        dtype="<u8"
+    ).reshape(-1, len(PLANE_PIECES))
+    # Little-endian bytes and bits, so bit i of each bitboard is square i.
+    planes = numpy.unpackbits(bitboards.view(numpy.uint8), bitorder="little")
+    return planes.reshape(-1, len(PLANE_PIECES), 64)
+
+
+def _get_score(white_points: "numpy.ndarray", black_points: "numpy.ndarray") -> "numpy.ndarray":
+    # Same operations as the evaluation functions of eval.py, so the results are equal.
+    total_points = white_points + black_points
+    scores = numpy.zeros(len(total_points))
+    nonzero = total_points != 0
+    scores[nonzero] = white_points[nonzero] / total_points[nonzero] * 2 - 1
+    return scores
+
+
+def batch_eval_material(planes: "numpy.ndarray") -> "numpy.ndarray":
+    """
+    Returns eval_material of each position of the piece planes.
+    """
+    _require_numpy()
+    weights = numpy.array([MATERIAL_POINTS[piece_type] for piece_type, _ in PLANE_PIECES], dtype=numpy.int64)
+    points = planes.sum(axis=2, dtype=numpy.int64) * weights
+    return _get_score(points[:, :6].sum(axis=1), points[:, 6:].sum(axis=1))
+
+
+def batch_eval_position(planes: "numpy.ndarray") -> "numpy.ndarray":
+    """
+    Returns eval_position of each position of the piece planes.
+    """
+    _require_numpy()
+    tables = numpy.array([POSITION_POINTS[piece_key] for piece_key in PLANE_PIECES], dtype=numpy.int64)
+    white_points = planes[:, :6].reshape(len(planes), 6 * 64) @ tables[:6].reshape(6 * 64)
+    black_points = planes[:, 6:].reshape(len(planes), 6 * 64) @ tables[6:].reshape(6 * 64)
+    return _get_score(white_points, black_points)
+
+
+def _get_slider_attacks_points(
+    occupancy: "numpy.ndarray",
+    positions: "numpy.ndarray",
+    squares: "numpy.ndarray",
+    directions
+) -> "numpy.ndarray":
+    # Center control points of the attacks of pieces sliding in the directions,
+    # given the positions and squares they are on: the squares of each ray up
+    # to and including the first occupied one.
+    square_points = numpy.array(SQUARE_POINTS, dtype=numpy.int64)
+    points = numpy.zeros(len(squares), dtype=numpy.int64)
+    for direction in directions:
+        ray_squares = numpy.array(RAY_SQUARES[direction])[squares]
+        occupied = occupancy[positions[:, None], ray_squares]
+        reached = numpy.ones(occupied.shape, dtype=bool)
+        reached[:, 1:] = ~numpy.logical_or.accumulate(occupied[:, :-1], axis=1)
+        points += (reached * square_points[ray_squares]).sum(axis=1)
+    return points
+
+
+def batch_eval_center_control(planes: "numpy.ndarray") -> "numpy.ndarray":
+    """
+    Returns eval_center_control of each position of the piece planes.
+    """
+    _require_numpy()
+    # Padded with the always occupied square of RAY_SQUARES.
+    occupancy = numpy.concatenate(
+        [planes.any(axis=1), numpy.ones((len(planes), 1), dtype=bool)], axis=1
+    )
+    color_points = {
+        PieceColor.WHITE: numpy.zeros(len(planes), dtype=numpy.int64),
+        PieceColor.BLACK: numpy.zeros(len(planes), dtype=numpy.int64)
+    }
+    for plane, (piece_type, color) in enumerate(PLANE_PIECES):
+        if piece_type in SLIDER_DIRECTIONS:
+            positions, squares = numpy.nonzero(planes[:, plane])
+            piece_points = _get_slider_attacks_points(occupancy, positions, squares, SLIDER_DIRECTIONS[piece_type])
+            points = numpy.bincount(positions, weights=piece_points, minlength=len(planes)).astype(numpy.int64)
+        else:
+            points = planes[:, plane] @ numpy.array(STEP_ATTACKS_POINTS[(piece_type, color)], dtype=numpy.int64)
+        color_points[color] += points * CENTER_CONTROL_FACTORS[piece_type]
+    return _get_score(color_points[PieceColor.WHITE], color_points[PieceColor.BLACK])
+
+
+def batch_evaluate(planes: "numpy.ndarray") -> "numpy.ndarray":
+    """
+    Returns the score of each position of the piece planes, as
+    Engine.evaluate scores positions that are not finished (the
+    weighted sum of the evaluation functions, without tablebases).
+    """
+    _require_numpy()
+    return (
+        batch_eval_material(planes) * MATERIAL_WEIGHT +
+        batch_eval_position(planes) * POSITION_WEIGHT +
+        batch_eval_center_control(planes) * CENTER_CONTROL_WEIGHT
+    )
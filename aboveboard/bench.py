@@ -0,0 +1,257 @@
+from aboveboard.batch import encode_positions, batch_eval_material, batch_eval_position, batch_eval_center_control
+from aboveboard.engine import Engine
+from aboveboard.eval import (
+    eval_material, eval_position, eval_center_control, MATERIAL_WEIGHT, POSITION_WEIGHT, CENTER_CONTROL_WEIGHT
+)
+from aboveboard.game import Game
+from random import Random
+from typing import List
+import time
+
+
+# Positions of the Lazy SMP benchmark.
+SMP_POSITIONS = [
+    "r1bqkbnr/1ppp1ppp/p1n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 0 4",
+    "rnbqk2r/ppp1bppp/4pn2/3p2B1/2PP4/2N5/PP2PPPP/R2QKBNR w KQkq - 4 5",
+    "rnbqkb1r/1p2pppp/p2p1n2/8/3NP3/2N5/PPP2PPP/R1BQKB1R w KQkq - 0 6",
+    "r1bqk2r/ppp2ppp/2n2n2/3p4/2BPP3/5N2/PP1N1PPP/R2QK2R w KQkq d6 0 9"
+]
+
+
+# Positions of the search benchmark by game phase,
+# and the depth each one is searched to.
+BENCH_POSITIONS = [
+    {
+        "name": "opening",
+        "fen": "r1bqkbnr/1ppp1ppp/p1n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 0 4",
+        "depth": 3
+    },
+    {
+        "name": "middlegame",
+        "fen": "r1bqk2r/ppp2ppp/2n2n2/3p4/2BPP3/5N2/PP1N1PPP/R2QK2R w KQkq d6 0 9",
+        "depth": 3
+    },
+    {
+        "name": "endgame",
+        "fen": "5k2/r1p5/n6P/p7/P7/2P2N2/2K5/8 b - - 0 30",
+        "depth": 4
+    },
+    {
+        "name": "tactical-knight",
+        "fen": "rn1qkbnr/ppp2p1p/3p2p1/4p3/2B1P1b1/2N2N2/PPPP1PPP/R1BQK2R w KQkq - 0 5",
+        "depth": 3
+    },
+    {
+        "name": "tactical-mate",
+        "fen": "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4",
+        "depth": 2
+    }
+]
+
+
+def benchmark_lazy_smp(
+    depth: int,
+    worker_counts: List[int],
+    positions: List[str] = SMP_POSITIONS,
+    progress_callback=None
+) -> List[dict]:
+    """
+    Measures the time the Lazy SMP search takes to reach depth over the
+    given positions, for each number of workers. Each number of workers
+    uses one engine, whose helpers are started and warmed up by an untimed
+    search before the timed ones, and whose tables are cleared before each
+    position. Returns a dict per number of workers with the total time, the
+    nodes searched by all processes, the nodes per second and the speedup
+    relative to the first number of workers.
+    """
+    results = []
+    for workers in worker_counts:
+        total_time = 0.0
+        nodes = 0
+        engine = Engine(depth, workers=workers, lazy_smp=True)
+        try:
+            engine.get_best_move(Game.from_fen(positions[0]))
+            for fen in positions:
+                game = Game.from_fen(fen)
+                engine.transposition_table.clear()
+                engine.evaluation_cache.clear()
+                start_time = time.monotonic()
+                engine.get_best_move(game)
+                total_time += time.monotonic() - start_time
+                nodes += engine.nodes + engine.quiescence_nodes
+                if progress_callback is not None:
+                    progress_callback(workers, fen)
+        finally:
+            engine.close()
+        results.append({
+            "workers": workers,
+            "time": total_time,
+            "nodes": nodes,
+            "nps": nodes / total_time if total_time > 0 else 0.0,
+            "speedup": results[0]["time"] / total_time if results and total_time > 0 else 1.0
+        })
+    return results
+
+
+# Engine options of the selective search, that can be disabled in the benchmark.
+SELECTIVE_SEARCH_OPTIONS = ["null_move_pruning", "late_move_reductions", "futility_pruning"]
+
+
+def run_bench(
+    positions: List[dict] = BENCH_POSITIONS,
+    progress_callback=None,
+    engine_options: dict|None = None
+) -> dict:
+    """
+    Searches each position with a new engine (created with the given
+    options, if any) to its depth. Returns the results of each position
+    (chosen move, nodes, quiescence nodes, time to depth and nodes per
+    second) and their totals.
+    """
+    results = []
+    for position in positions:
+        game = Game.from_fen(position["fen"])
+        engine = Engine(position["depth"], **(engine_options or {}))
+        start_time = time.monotonic()
+        move = engine.get_best_move(game)
+        total_time = time.monotonic() - start_time
+        nodes = engine.nodes + engine.quiescence_nodes
+        results.append({
+            "name": position["name"],
+            "depth": position["depth"],
+            "move": move.to_string() if move is not None else None,
+            "nodes": engine.nodes,
+            "quiescence_nodes": engine.quiescence_nodes,
+            "time": total_time,
+            "nps": nodes / total_time if total_time > 0 else 0.0
+        })
+        if progress_callback is not None:
+            progress_callback(position["name"])
+    nodes = sum(r["nodes"] + r["quiescence_nodes"] for r in results)
+    total_time = sum(r["time"] for r in results)
+    return {
+        "positions": results,
+        "nodes": nodes,
+        "time": total_time,
+        "nps": nodes / total_time if total_time > 0 else 0.0
+    }
+
+
+def compare_bench(results: dict, baseline: dict, tolerance: float = 0.1) -> dict:
+    """
+    Compares bench results with baseline ones, position by position.
+    Searches are deterministic, so nodes (including quiescence nodes)
+    that grow more than the tolerance (a fraction of the baseline value)
+    and chosen moves that differ are regressions, and nodes that shrink
+    more than it are improvements. Times depend on the machine and its
+    load, so their changes beyond the tolerance are only reported as
+    timings. Positions that can not be compared are changes. Returns the
+    messages of each kind.
+    """
+    comparison = {"regressions": [], "improvements": [], "timings": [], "changes": []}
+    baseline_positions = {r["name"]: r for r in baseline["positions"]}
+    for result in results["positions"]:
+        name = result["name"]
+        baseline_result = baseline_positions.get(name)
+        if baseline_result is None:
+            comparison["changes"].append(f"{name}: not in baseline")
+            continue
+        if result["depth"] != baseline_result["depth"]:
+            comparison["changes"].append(
+                f"{name}: depth {baseline_result['depth']} -> {result['depth']}, not compared"
+            )
+            continue
+        for field, value, baseline_value in [
+            ("nodes", result["nodes"] + result["quiescence_nodes"],
+                baseline_result["nodes"] + baseline_result["quiescence_nodes"]),
+            ("time", result["time"], baseline_result["time"])
+        ]:
+            if baseline_value == 0:
+                continue
+            change = value / baseline_value - 1
+            message = f"{name}: {field} {baseline_value:.6g} -> {value:.6g} ({change:+.1%})"
+            if abs(change) <= tolerance:
+                continue
+            if field == "time":
+                comparison["timings"].append(message)
+            elif change > 0:
+                comparison["regressions"].append(message)
+            else:
+                comparison["improvements"].append(message)
+        if result["move"] != baseline_result["move"]:
+            comparison["regressions"].append(
+                f"{name}: move {baseline_result['move']} -> {result['move']}"
+            )
+    return comparison
+
+
+def generate_positions(count: int, seed: int = 0, max_plies: int = 80) -> List[str]:
+    """
+    Returns the FEN of count positions (that are not finished) of
+    games of random moves, of up to max_plies moves each. The same
+    seed returns the same positions.
+    """
+    random = Random(seed)
+    positions = []
+    game = Game()
+    while len(positions) < count:
+        if game.is_finished() or len(game.get_move_history()) >= max_plies:
+            game = Game()
+        game.apply_move(random.choice(game.legal_moves()), skip_legal_moves=True)
+        if not game.is_finished():
+            positions.append(game.to_fen())
+    return positions
+
+
+def benchmark_batch_evaluation(
+    positions: List[str],
+    chunk_size: int = 1000,
+    progress_callback=None
+) -> dict:
+    """
+    Evaluates the positions (in FEN) with the evaluation functions and
+    with the batch evaluation, chunk_size positions at a time. Returns
+    the time taken and positions per second of each one (the batch time
+    includes encoding the positions), and the number of positions whose
+    terms or score differ between them, that should be 0.
+    """
+    scalar_time = 0.0
+    encode_time = 0.0
+    batch_time = 0.0
+    mismatches = 0
+    for start in range(0, len(positions), chunk_size):
+        games = [Game.from_fen(fen) for fen in positions[start:start + chunk_size]]
+        start_time = time.monotonic()
+        scalar_terms = [(eval_material(game), eval_position(game), eval_center_control(game)) for game in games]
+        scalar_scores = [
+            sum([material * MATERIAL_WEIGHT, position * POSITION_WEIGHT, center_control * CENTER_CONTROL_WEIGHT])
+            for material, position, center_control in scalar_terms
+        ]
+        scalar_time += time.monotonic() - start_time
+        start_time = time.monotonic()
+        planes = encode_positions(games)
+        encode_time += time.monotonic() - start_time
+        start_time = time.monotonic()
+        batch_terms = [batch_eval_material(planes), batch_eval_position(planes), batch_eval_center_control(planes)]
+        batch_scores = (
+            batch_terms[0] * MATERIAL_WEIGHT + batch_terms[1] * POSITION_WEIGHT + batch_terms[2] * CENTER_CONTROL_WEIGHT
+        )
+        batch_time += time.monotonic() - start_time
+        for index, terms in enumerate(scalar_terms):
+            if (
+                any(term != batch_term[index] for term, batch_term in zip(terms, batch_terms)) or
+                scalar_scores[index] != batch_scores[index]
+            ):
+                mismatches += 1
+        if progress_callback is not None:
+            progress_callback(start + len(games))
+    total_batch_time = encode_time + batch_time
+    return {
+        "positions": len(positions),
+        "scalar_time": scalar_time,
+        "scalar_positions_per_second": len(positions) / scalar_time if scalar_time > 0 else 0.0,
+        "encode_time": encode_time,
+        "batch_time": batch_time,
+        "batch_positions_per_second": len(positions) / total_batch_time if total_batch_time > 0 else 0.0,
+        "mismatches": mismatches
+    }
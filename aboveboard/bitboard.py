@@ -0,0 +1,123 @@
+from aboveboard.piece import King, Queen, Rook, Bishop, Knight, Pawn, PieceColor
+from typing import Iterator
+
+
+# Squares are indexed from 0 (a1) to 63 (h8), rank by rank: index = rank * 8 + file.
+# A bitboard is an int where bit i is set if square i belongs to the set.
+
+def square_index(file: int, rank: int) -> int:
+    return rank * 8 + file
+
+
+def iterate_bits(bitboard: int) -> Iterator[int]:
+    while bitboard:
+        lowest_bit = bitboard & -bitboard
+        yield lowest_bit.bit_length() - 1
+        bitboard ^= lowest_bit
+
+
+def _build_step_attacks(steps) -> list:
+    attacks = []
+    for index in range(64):
+        file, rank = index % 8, index // 8
+        mask = 0
+        for file_inc, rank_inc in steps:
+            if 0 <= file + file_inc < 8 and 0 <= rank + rank_inc < 8:
+                mask |= 1 << square_index(file + file_inc, rank + rank_inc)
+        attacks.append(mask)
+    return attacks
+
+
+KNIGHT_ATTACKS = _build_step_attacks(
+    [(-1, 2), (1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1)]
+)
+KING_ATTACKS = _build_step_attacks(
+    [(-1, 1), (0, 1), (1, 1), (-1, 0), (1, 0), (-1, -1), (0, -1), (1, -1)]
+)
+# Squares attacked by a pawn of the given color standing on each square.
+# Pawns on their last rank attack nothing, consistently with Pawn.get_destinations.
+PAWN_ATTACKS = {
+    PieceColor.WHITE: [
+        mask if index // 8 != 7 else 0
+        for index, mask in enumerate(_build_step_attacks([(-1, 1), (1, 1)]))
+    ],
+    PieceColor.BLACK: [
+        mask if index // 8 != 0 else 0
+        for index, mask in enumerate(_build_step_attacks([(-1, -1), (1, -1)]))
+    ]
+}
+
+
+# Ray directions. The positive ones go towards higher square indexes,
+# so the closest blocker on them is the lowest set bit, and vice versa.
+NORTH, EAST, NORTH_EAST, NORTH_WEST = 0, 1, 2, 3
+SOUTH, WEST, SOUTH_WEST, SOUTH_EAST = 4, 5, 6, 7
+DIRECTION_INCS = [(0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1)]
+ROOK_DIRECTIONS = [NORTH, EAST, SOUTH, WEST]
+BISHOP_DIRECTIONS = [NORTH_EAST, SOUTH_EAST, SOUTH_WEST, NORTH_WEST]
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+
+def _build_rays() -> list:
+    rays = []
+    for file_inc, rank_inc in DIRECTION_INCS:
+        direction_rays = []
+        for index in range(64):
+            file, rank = index % 8, index // 8
+            mask = 0
+            file, rank = file + file_inc, rank + rank_inc
+            while 0 <= file < 8 and 0 <= rank < 8:
+                mask |= 1 << square_index(file, rank)
+                file, rank = file + file_inc, rank + rank_inc
+            direction_rays.append(mask)
+        rays.append(direction_rays)
+    return rays
+
+
+RAYS = _build_rays()
+
+
+def _build_between() -> list:
+    # Squares strictly between two squares on the same file, rank or diagonal.
+    between = [[0] * 64 for index in range(64)]
+    for direction in range(8):
+        for index in range(64):
+            for other_index in iterate_bits(RAYS[direction][index]):
+                between[index][other_index] = (
+                    RAYS[direction][index] ^ RAYS[direction][other_index] ^ (1 << other_index)
+                )
+    return between
+
+
+BETWEEN = _build_between()
+ALL_SQUARES = (1 << 64) - 1
+
+
+def get_ray_attacks(index: int, occupancy: int, directions) -> int:
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][index]
+        blockers = ray & occupancy
+        if blockers:
+            if direction < SOUTH:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+
+def get_piece_attacks(piece_type: type, color: PieceColor, index: int, occupancy: int) -> int:
+    if piece_type == Pawn:
+        return PAWN_ATTACKS[color][index]
+    elif piece_type == Knight:
+        return KNIGHT_ATTACKS[index]
+    elif piece_type == King:
+        return KING_ATTACKS[index]
+    elif piece_type == Bishop:
+        return get_ray_attacks(index, occupancy, BISHOP_DIRECTIONS)
+    elif piece_type == Rook:
+        return get_ray_attacks(index, occupancy, ROOK_DIRECTIONS)
+    else: # piece_type == Queen
+        return get_ray_attacks(index, occupancy, QUEEN_DIRECTIONS)
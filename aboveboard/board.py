@@ -1,16 +1,38 @@
-
+from aboveboard.bitboard import (
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS,
+    get_ray_attacks, iterate_bits
+)
 from aboveboard.coord import Coord
 from aboveboard.piece import King, Queen, Rook, Bishop, Knight, Pawn, Piece, PieceColor
+from aboveboard.points import MATERIAL_POINTS, POSITION_POINTS
+from aboveboard.zobrist import PIECE_KEYS
 from typing import List
 
 
+PIECE_TYPES = [King, Queen, Rook, Bishop, Knight, Pawn]
+FIGURE_TYPES = [King, Queen, Rook, Bishop, Knight]
+
+
 class Board:
 
-    def __init__(self):
-        self._board = [[None for file in range(8)] for rank in range(8)]
-        self._white_pieces = []
-        self._black_pieces = []
-        self._piece_coords = {}
+    def __init__(self, empty: bool = False):
+        """
+        Board with the pieces in their initial squares,
+        or without pieces if empty is True.
+        """
+        self._board = [None] * 64
+        self._bitboards = {
+            (piece_type, color): 0
+            for piece_type in PIECE_TYPES
+            for color in [PieceColor.WHITE, PieceColor.BLACK]
+        }
+        self._occupancy = {PieceColor.WHITE: 0, PieceColor.BLACK: 0}
+        self._piece_coords = {PieceColor.WHITE: {}, PieceColor.BLACK: {}}
+        self._hash = 0
+        self._material_points = {PieceColor.WHITE: 0, PieceColor.BLACK: 0}
+        self._position_points = {PieceColor.WHITE: 0, PieceColor.BLACK: 0}
+        if empty:
+            return
         self._populate_figures(PieceColor.BLACK, 7)
         self._populate_pawns(PieceColor.BLACK, 6)
         self._populate_pawns(PieceColor.WHITE, 1)
@@ -31,52 +53,134 @@ class Board:
             self.set_piece_at(Pawn(color), Coord(i, rank))
 
     def get_pieces(self, color: PieceColor|None = None) -> List[Piece]:
-        if color == PieceColor.WHITE:
-            return self._white_pieces
-        elif color == PieceColor.BLACK:
-            return self._black_pieces
-        else: # color is None
-            return self._white_pieces + self._black_pieces
-        
+        if color is None:
+            return (
+                list(self._piece_coords[PieceColor.WHITE]) +
+                list(self._piece_coords[PieceColor.BLACK])
+            )
+        return list(self._piece_coords[color])
+
     def get_pawns(self, color: PieceColor|None = None) -> List[Pawn]:
-        return [p for p in self.get_pieces(color) if type(p) == Pawn]
-    
+        if color is None:
+            bitboard = (
+                self._bitboards[(Pawn, PieceColor.WHITE)] |
+                self._bitboards[(Pawn, PieceColor.BLACK)]
+            )
+        else:
+            bitboard = self._bitboards[(Pawn, color)]
+        return [self._board[index] for index in iterate_bits(bitboard)]
+
     def get_figures(self, color: PieceColor|None = None) -> List[Piece]:
-        return [p for p in self.get_pieces(color) if type(p) != Pawn]
+        bitboard = self.get_occupancy(color)
+        for pawn_color in [PieceColor.WHITE, PieceColor.BLACK]:
+            bitboard &= ~self._bitboards[(Pawn, pawn_color)]
+        return [self._board[index] for index in iterate_bits(bitboard)]
 
     def get_king(self, color: PieceColor) -> King|None:
-        for piece in self.get_pieces(color):
-            if type(piece) == King:
-                return piece
-        return None
+        bitboard = self._bitboards[(King, color)]
+        if bitboard == 0:
+            return None
+        return self._board[bitboard.bit_length() - 1]
+
+    def hash(self) -> int:
+        """
+        Zobrist hash of the piece placement, updated incrementally
+        every time a piece is set or removed.
+        """
+        return self._hash
+
+    def get_material_points(self, color: PieceColor) -> int:
+        return self._material_points[color]
+
+    def get_position_points(self, color: PieceColor) -> int:
+        return self._position_points[color]
+
+    def get_bitboard(self, piece_type: type, color: PieceColor) -> int:
+        return self._bitboards[(piece_type, color)]
+
+    def get_occupancy(self, color: PieceColor|None = None) -> int:
+        if color is None:
+            return self._occupancy[PieceColor.WHITE] | self._occupancy[PieceColor.BLACK]
+        return self._occupancy[color]
+
+    def get_attackers(self, index: int, color: PieceColor, occupancy: int|None = None) -> int:
+        """
+        Returns a bitboard with the pieces of the given color that attack
+        the square with the given index. The occupancy used to compute
+        sliding attacks can be overriden (i.e. to look through a piece).
+        """
+        if occupancy is None:
+            occupancy = self.get_occupancy()
+        bitboards = self._bitboards
+        other_color = PieceColor.BLACK if color == PieceColor.WHITE else PieceColor.WHITE
+        attackers = (
+            KNIGHT_ATTACKS[index] & bitboards[(Knight, color)] |
+            KING_ATTACKS[index] & bitboards[(King, color)] |
+            PAWN_ATTACKS[other_color][index] & bitboards[(Pawn, color)]
+        )
+        queens = bitboards[(Queen, color)]
+        rooks = bitboards[(Rook, color)] | queens
+        if rooks:
+            attackers |= get_ray_attacks(index, occupancy, ROOK_DIRECTIONS) & rooks
+        bishops = bitboards[(Bishop, color)] | queens
+        if bishops:
+            attackers |= get_ray_attacks(index, occupancy, BISHOP_DIRECTIONS) & bishops
+        return attackers & occupancy
+
+    def is_attacked_by(self, index: int, color: PieceColor) -> bool:
+        bitboards = self._bitboards
+        other_color = PieceColor.BLACK if color == PieceColor.WHITE else PieceColor.WHITE
+        if (
+            KNIGHT_ATTACKS[index] & bitboards[(Knight, color)] or
+            PAWN_ATTACKS[other_color][index] & bitboards[(Pawn, color)] or
+            KING_ATTACKS[index] & bitboards[(King, color)]
+        ):
+            return True
+        occupancy = self._occupancy[PieceColor.WHITE] | self._occupancy[PieceColor.BLACK]
+        queens = bitboards[(Queen, color)]
+        rooks = bitboards[(Rook, color)] | queens
+        if rooks and get_ray_attacks(index, occupancy, ROOK_DIRECTIONS) & rooks:
+            return True
+        bishops = bitboards[(Bishop, color)] | queens
+        if bishops and get_ray_attacks(index, occupancy, BISHOP_DIRECTIONS) & bishops:
+            return True
+        return False
 
     def get_piece_at(self, coord: Coord) -> Piece|None:
-        return self._board[coord.file][coord.rank]
+        return self._board[coord.index]
 
     def set_piece_at(self, piece: Piece, coord: Coord) -> None:
-        self._board[coord.file][coord.rank] = piece
-        self._piece_coords[piece] = coord
-        if piece.color == PieceColor.WHITE:
-            self._white_pieces.append(piece)
-        else: # piece.color == PieceColor.BLACK
-            self._black_pieces.append(piece)
+        index = coord.index
+        mask = 1 << index
+        piece_key = (type(piece), piece.color)
+        self._board[index] = piece
+        self._bitboards[piece_key] |= mask
+        self._hash ^= PIECE_KEYS[piece_key][index]
+        self._material_points[piece.color] += MATERIAL_POINTS[piece_key[0]]
+        self._position_points[piece.color] += POSITION_POINTS[piece_key][index]
+        self._occupancy[piece.color] |= mask
+        self._piece_coords[piece.color][piece] = coord
 
     def remove_piece_at(self, coord: Coord) -> Piece:
-        piece = self.get_piece_at(coord)
-        self._board[coord.file][coord.rank] = None
-        if piece not in self._piece_coords:
-            print(coord.to_string())
-        del self._piece_coords[piece]
-        if piece.color == PieceColor.WHITE:
-            self._white_pieces.remove(piece)
-        else: # piece.color == PieceColor.BLACK
-            self._black_pieces.remove(piece)
+        index = coord.index
+        piece = self._board[index]
+        if piece is None:
+            raise Exception(f"No piece at {coord.to_string()}.")
+        mask = 1 << index
+        piece_key = (type(piece), piece.color)
+        self._board[index] = None
+        self._bitboards[piece_key] ^= mask
+        self._hash ^= PIECE_KEYS[piece_key][index]
+        self._material_points[piece.color] -= MATERIAL_POINTS[piece_key[0]]
+        self._position_points[piece.color] -= POSITION_POINTS[piece_key][index]
+        self._occupancy[piece.color] ^= mask
+        del self._piece_coords[piece.color][piece]
         return piece
 
     def get_piece_coord(self, piece: Piece) -> Coord:
-        if piece not in self._piece_coords:
+        if piece not in self._piece_coords[piece.color]:
             raise Exception(f"Piece {piece.to_string()} not in board.")
-        return self._piece_coords[piece]
+        return self._piece_coords[piece.color][piece]
 
     def to_string(self, reverse=False) -> str:
         text  = "    a   b   c   d   e   f   g   h    \n"
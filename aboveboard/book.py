@@ -0,0 +1,97 @@
+from aboveboard.game import Game
+from aboveboard.move import Move
+from collections import defaultdict
+from random import choices
+from typing import Iterable, List, Tuple
+import mmap
+import struct
+
+
+class OpeningBook:
+    """
+    Opening book file, probed through mmap, so it is never loaded into
+    memory as a whole. It has the layout of Polyglot books: entries of
+    16 bytes sorted by key, with the position hash (Game.hash, so the
+    keys are not the Polyglot ones), the move code (Move.to_code),
+    the weight of the move and 4 unused bytes, all big-endian.
+    Positions are found with a binary search.
+    """
+
+    ENTRY_FORMAT = struct.Struct(">QHHI")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = self._file.seek(0, 2)
+        self.entry_count = size // OpeningBook.ENTRY_FORMAT.size
+        # Empty files can not be mapped.
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else None
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_moves(self, game: Game) -> List[Tuple[Move, int]]:
+        """
+        Returns the legal moves of the book for the current position
+        of the game, with their weights.
+        """
+        key = game.hash()
+        low, high = 0, self.entry_count
+        # First entry with a key not lower than the position hash.
+        while low < high:
+            middle = (low + high) // 2
+            if self._read_entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        for index in range(low, self.entry_count):
+            entry_key, move_code, weight, _ = self._read_entry(index)
+            if entry_key != key:
+                break
+            move = Move.from_code(move_code)
+            if weight > 0 and game.is_legal_move(move):
+                moves.append((move, weight))
+        return moves
+
+    def choose_move(self, game: Game) -> Move|None:
+        """
+        Returns a random book move for the current position of the game,
+        with probabilities proportional to the weights, or None if the
+        position is not in the book.
+        """
+        moves = self.get_moves(game)
+        if not moves:
+            return None
+        return choices([m for m, _ in moves], weights=[w for _, w in moves])[0]
+
+    def _read_entry(self, index: int) -> Tuple[int, int, int, int]:
+        return OpeningBook.ENTRY_FORMAT.unpack_from(self._map, index * OpeningBook.ENTRY_FORMAT.size)
+
+
+def build_opening_book(lines: Iterable[str], path: str, max_plies: int|None = None) -> int:
+    """
+    Writes an opening book file with the moves of the given lines (move
+    sequences in long algebraic notation, separated by spaces), up to
+    max_plies moves of each one. The weight of each move is the number
+    of lines that play it in its position. Returns the number of entries.
+    """
+    weights = defaultdict(int)
+    for line in lines:
+        game = Game()
+        for notation in line.split()[:max_plies]:
+            move = Move.from_notation(notation)
+            weights[(game.hash(), move.to_code())] += 1
+            game.apply_move(move)
+    with open(path, "wb") as book_file:
+        for (key, move_code), weight in sorted(weights.items()):
+            book_file.write(OpeningBook.ENTRY_FORMAT.pack(key, move_code, min(weight, 0xffff), 0))
+    return len(weights)
@@ -1,33 +1,66 @@
 
 class Coord:
+    """
+    Flyweight: there are exactly 64 Coord instances, one per square,
+    built when the module is loaded. Coord(file, rank) and the other
+    constructors return the shared instance, so Coords can be compared
+    by identity and used as dict keys.
+    """
 
     FILE_CODES = ["a", "b", "c", "d", "e", "f", "g", "h"]
 
-    def __init__(self, file: int, rank: int):
+    __slots__ = ("file", "rank", "index", "notation")
+
+    def __new__(cls, file: int, rank: int):
         if file < 0 or file > 7:
             raise Exception(f"File coordinate {file} out of bounds.")
         if rank < 0 or rank > 7:
             raise Exception(f"Rank coordinate {rank} out of bounds.")
-        self.file = file
-        self.rank = rank
+        return _COORDS[rank * 8 + file]
+
+    @classmethod
+    def _create(cls, index: int):
+        coord = object.__new__(cls)
+        coord.file = index % 8
+        coord.rank = index // 8
+        coord.index = index
+        coord.notation = f"{Coord.FILE_CODES[coord.file]}{coord.rank + 1}"
+        return coord
+
+    @classmethod
+    def from_index(cls, index: int):
+        return _COORDS[index]
 
     @classmethod
     def from_notation(cls, notation: str):
+        coord = _COORDS_BY_NOTATION.get(notation)
+        if coord is not None:
+            return coord
         if len(notation) != 2:
             raise Exception(f"Invalid coord notation {notation}.")
         if notation[0] not in Coord.FILE_CODES:
             raise Exception(f"Invalid file notation {notation[0]}.")
-        file = Coord.FILE_CODES.index(notation[0])
-        try:
-            rank = int(notation[1]) - 1
-        except ValueError:
-            raise Exception(f"Invalid rank notation {notation[1]}.")
-        if rank < 0 or rank > 7:
-            raise Exception(f"Invalid rank notation {notation[1]}.")
-        return Coord(file, rank)
-    
+        raise Exception(f"Invalid rank notation {notation[1]}.")
+
     def __eq__(self, other) -> bool:
-        return self.file == other.file and self.rank == other.rank
+        return self is other
+
+    def __hash__(self) -> int:
+        return self.index
+
+    def __reduce__(self):
+        # Unpickled coords are the shared instances too.
+        return (Coord.from_index, (self.index,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def to_string(self) -> str:
-        return f"{Coord.FILE_CODES[self.file]}{self.rank + 1}"
+        return self.notation
+
+
+_COORDS = tuple(Coord._create(index) for index in range(64))
+_COORDS_BY_NOTATION = {coord.notation: coord for coord in _COORDS}
@@ -1,107 +1,914 @@
 
+from aboveboard.book import OpeningBook
+from aboveboard.cache import LRUCache
 from aboveboard.eval import *
-from aboveboard.game import Game
-from aboveboard.move import Move, Capture, PromotionCapture, EnPassantCapture, Castling
+from aboveboard.game import Game, MoveStage
+from aboveboard.move import Move, Capture, Promotion, PromotionCapture, EnPassantCapture, Castling
 from aboveboard.piece import PieceColor
-from random import shuffle
-from typing import List
+from aboveboard.points import MATERIAL_POINTS, POSITION_POINTS
+from aboveboard.tablebase import Tablebases
+from aboveboard.transposition import BoundType, SharedTranspositionTable, TranspositionTable
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from ctypes import c_bool
+from multiprocessing import get_all_start_methods, get_context
+from random import Random
+from typing import Iterator, List, Tuple
+import pickle
+import time
+
+
+# Worker processes are not forked from the engine process, that may have
+# other threads holding locks (i.e. one reading stdin) the workers would inherit.
+_WORKERS_CONTEXT = get_context("forkserver" if "forkserver" in get_all_start_methods() else "spawn")
+
+
+class SearchTimeout(Exception):
+    pass
+
 
 class Engine:
 
-    def __init__(self, min_max_depth: int):
+    # Number of moves the remaining clock time is expected to be split into.
+    CLOCK_MOVES_TO_GO = 30
+    # Width of the windows that only test whether a score beats a bound.
+    NULL_WINDOW = 1e-6
+    # Depth reduction of the search after a null move, and minimum depth to try one.
+    NULL_MOVE_REDUCTION = 2
+    NULL_MOVE_MIN_DEPTH = 3
+    # Quiet moves from this index on (in move order) are searched 1 ply
+    # shallower first, at this depth or more.
+    LATE_MOVE_MIN_INDEX = 3
+    LATE_MOVE_MIN_DEPTH = 3
+    # Material points a quiet move is not expected to gain, by remaining depth
+    # (futility pruning is only done at the depths listed).
+    FUTILITY_MARGINS = [0, 2, 4]
+    # Largest change of the position points of a side a quiet move can cause
+    # (the range of the tables: castlings change them by 3 at most too), and
+    # of eval_center_control (measured over quiet moves of random games, where
+    # it stayed below 0.23), for the margins of futility pruning.
+    FUTILITY_POSITION_POINTS = max(max(points) - min(points) for points in POSITION_POINTS.values())
+    FUTILITY_CENTER_CONTROL = 0.25
+    # Half the width of the window around the score of the previous iteration
+    # that iterations are searched with first (about 1 pawn at the start).
+    ASPIRATION_WINDOW = 0.025
+
+    def __init__(
+        self,
+        min_max_depth: int,
+        transposition_table_mb: float = 16,
+        evaluation_cache_size: int = 200000,
+        quiescence_depth: int = 4,
+        workers: int = 1,
+        lazy_smp: bool = False,
+        opening_book: str|None = None,
+        tablebases: str|None = None,
+        null_move_pruning: bool = True,
+        late_move_reductions: bool = True,
+        futility_pruning: bool = True
+    ):
         self.min_max_depth = min_max_depth
+        # Maximum number of captures/promotions searched beyond min_max_depth (0 disables it).
+        self.quiescence_depth = quiescence_depth
+        # Selective search: moves that are unlikely to matter are searched
+        # less deeply (or not at all). See evaluate_min_max.
+        self.null_move_pruning = null_move_pruning
+        self.late_move_reductions = late_move_reductions
+        self.futility_pruning = futility_pruning
+        if workers > 1 and lazy_smp:
+            self.transposition_table = SharedTranspositionTable(transposition_table_mb)
+        else:
+            self.transposition_table = TranspositionTable(transposition_table_mb)
+        # Shared by all get_best_move calls, so consecutive searches reuse it.
+        self.evaluation_cache = LRUCache(evaluation_cache_size)
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        # Deepest search completed by the last get_best_move call, and its score.
+        self.completed_depth = None
+        self.best_score = None
+        self._deadline = None
+        # Set to stop the search (see stop). Worker processes share their one.
+        self._stop_flag = c_bool(False)
+        # Number of processes the search is split across (1 searches serially).
+        # By default, each one searches some of the root moves. With lazy_smp,
+        # all of them search the whole tree and share the transposition table.
+        self.workers = workers
+        self.lazy_smp = lazy_smp
+        self._worker_settings = {
+            "min_max_depth": min_max_depth,
+            "transposition_table_mb": transposition_table_mb,
+            "evaluation_cache_size": evaluation_cache_size,
+            "quiescence_depth": quiescence_depth,
+            "tablebases": tablebases,
+            "null_move_pruning": null_move_pruning,
+            "late_move_reductions": late_move_reductions,
+            "futility_pruning": futility_pruning
+        }
+        self._executor = None
+        self._shared_bound = None
+        self._helpers_stop_flag = None
+        # Move ordering heuristics, learned from the cutoffs of each search:
+        # the last 2 quiet moves that cut off at each ply (killer moves),
+        # and the cutoffs of quiet moves by piece and destination (history).
+        self._killer_moves = []
+        self._history = {}
+        # Triangular table with the principal variation of the nodes being
+        # searched, by ply, and the one of the last get_best_move call.
+        self._principal_variations = []
+        self._principal_variation = []
+        # Opening book (given the path of its file) played from before searching.
+        self.opening_book = OpeningBook(opening_book) if opening_book is not None else None
+        # Endgame tablebases (given the directory of their files): their positions
+        # are played without searching, and evaluated exactly when searching.
+        self.tablebases = Tablebases(tablebases) if tablebases is not None else None
 
-    def get_best_move(self, game: Game, move_eval_callback=None) -> Move:
-        legal_moves = self._sort_legal_moves(game)
-        best_move, alpha, beta = None, -1.1, 1.1
-        if game.turn == PieceColor.WHITE:
-            for move in legal_moves:
-                game.apply_move(move)
-                score = self.evaluate_min_max(game, alpha, beta, self.min_max_depth)
+    def stop(self) -> None:
+        """
+        Makes the running get_best_move call (i.e. in another thread)
+        return as soon as possible, as if its time budget had run out.
+        If the call has not started searching yet, it stops as soon as it
+        does. The stop lasts until reset_stop is called.
+        """
+        self._stop_flag.value = True
+        if self._helpers_stop_flag is not None:
+            self._helpers_stop_flag.value = 1
+
+    def reset_stop(self) -> None:
+        """
+        Clears a stop, so that the next get_best_move call searches.
+        Called before starting a search that may be stopped (i.e. before
+        starting its thread), so that no stop is missed.
+        """
+        self._stop_flag.value = False
+        if self._helpers_stop_flag is not None:
+            self._helpers_stop_flag.value = 0
+
+    def close(self) -> None:
+        """
+        Shuts down the worker processes of the parallel search, if any,
+        and closes the opening book and tablebases.
+        """
+        if self.opening_book is not None:
+            self.opening_book.close()
+            self.opening_book = None
+        if self.tablebases is not None:
+            self.tablebases.close()
+            self.tablebases = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._shared_bound = None
+            self._helpers_stop_flag = None
+
+    def get_best_move(
+        self,
+        game: Game,
+        move_eval_callback=None,
+        move_time: float|None = None,
+        remaining_time: float|None = None,
+        increment: float = 0.0,
+        iteration_callback=None
+    ) -> Move:
+        """
+        Without time constraints, searches to min_max_depth.
+        Otherwise, deepens iteratively up to min_max_depth until the time
+        budget runs out, and returns the best move of the deepest completed
+        iteration. The budget is move_time seconds, or a share of the
+        remaining_time on the clock (plus increment) if that is given,
+        or the minimum of both. The search can also be ended with stop.
+        Positions of the opening book or the tablebases are not searched:
+        one of their book moves, or the best move according to the
+        tablebases, is returned (and completed_depth is left as None).
+        Iterations after the first one are searched with an aspiration
+        window around the score of the previous one first.
+        The expected line is kept, see get_principal_variation. If the game
+        followed the one of the previous call, its next move is searched first.
+        iteration_callback, if given, is called with the depth, best move and
+        score of each completed iteration, once that line is kept.
+        """
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.completed_depth = None
+        self.best_score = None
+        self._killer_moves = []
+        self._history = {}
+        expected_move = self._get_expected_move(game)
+        self._principal_variation = []
+        if self.opening_book is not None:
+            book_move = self.opening_book.choose_move(game)
+            if book_move is not None:
+                self._principal_variation = [book_move]
+                return book_move
+        if self.tablebases is not None and not game.is_finished():
+            tablebase_move = self.tablebases.choose_move(game)
+            if tablebase_move is not None:
+                self._principal_variation = [tablebase_move]
+                return tablebase_move
+        if self.workers <= 1:
+            search_root = self._search_root
+        elif self.lazy_smp:
+            search_root = self._search_root_lazy_smp
+        else:
+            search_root = self._search_root_parallel
+        # Before the time budget starts, as it may take long.
+        self.start_workers()
+        time_limit = self.get_time_limit(move_time, remaining_time, increment)
+        history_length = len(game.get_move_history())
+        best_move = None
+        try:
+            if time_limit is None:
+                best_move, self.best_score = search_root(
+                    game, self.min_max_depth, expected_move, move_eval_callback
+                )
+                self.completed_depth = self.min_max_depth
+                self._principal_variation = self._get_principal_variation(game, best_move, self.min_max_depth + 1)
+                if iteration_callback is not None:
+                    iteration_callback(self.completed_depth, best_move, self.best_score)
+            else:
+                start_time = time.monotonic()
+                self._deadline = start_time + time_limit
+                for depth in range(self.min_max_depth + 1):
+                    best_move, self.best_score = self._search_aspiration_window(
+                        search_root, game, depth, best_move or expected_move, move_eval_callback
+                    )
+                    self.completed_depth = depth
+                    self._principal_variation = self._get_principal_variation(game, best_move, depth + 1)
+                    if iteration_callback is not None:
+                        iteration_callback(depth, best_move, self.best_score)
+                    if abs(self.best_score) == 1.0 or len(game.legal_moves()) == 1:
+                        break
+                    # Do not start an iteration that most likely won't finish in time.
+                    if time.monotonic() - start_time > time_limit / 2:
+                        break
+        except SearchTimeout:
+            while len(game.get_move_history()) > history_length:
+                game.unapply_last_move()
+        finally:
+            self._deadline = None
+        if best_move is None and len(game.legal_moves()) > 0:
+            best_move = self._sort_legal_moves(game)[0]
+        return best_move
+
+    def get_principal_variation(self) -> List[Move]:
+        """
+        Returns the line expected by the last get_best_move call, from its
+        best move on, as deep as the deepest completed iteration (or less,
+        if the game ends or some of its moves are not known).
+        """
+        return list(self._principal_variation)
+
+    def get_ponder_move(self, game: Game, move: Move) -> Move|None:
+        """
+        Returns the expected reply to the given legal move: the second move
+        of the principal variation, if it starts with it, the book move
+        with the highest weight for the position after it or, out of the
+        book, the best move stored in the transposition table for it,
+        if there is one and it is legal.
+        """
+        principal_variation = self._principal_variation
+        if len(principal_variation) > 1 and principal_variation[0] == move:
+            return principal_variation[1]
+        game.apply_move(move, skip_legal_moves=True)
+        ponder_move = None
+        book_moves = self.opening_book.get_moves(game) if self.opening_book is not None else []
+        if book_moves:
+            game.unapply_last_move()
+            return max(book_moves, key=lambda book_move: book_move[1])[0]
+        entry = self.transposition_table.probe(game.hash())
+        if (
+            entry is not None and entry.best_move is not None and
+            not game.is_finished() and game.is_legal_move(entry.best_move)
+        ):
+            ponder_move = entry.best_move
+        game.unapply_last_move()
+        return ponder_move
+
+    def _get_expected_move(self, game: Game) -> Move|None:
+        # The move of the principal variation of the last get_best_move call for the
+        # current position, if the game followed it (i.e. the opponent played the
+        # expected reply to the best move).
+        principal_variation = self._principal_variation
+        history = game.get_move_history()
+        for played_moves in range(1, len(principal_variation)):
+            if history[-played_moves:] == principal_variation[:played_moves]:
+                return principal_variation[played_moves]
+        return None
+
+    def _get_principal_variation(self, game: Game, best_move: Move|None, length: int) -> List[Move]:
+        # The line of the PV table is followed on through the
+        # transposition table, where it ends at a cutoff.
+        if best_move is None:
+            return []
+        principal_variation = self._principal_variations[0] if self._principal_variations else []
+        if not principal_variation or principal_variation[0] != best_move:
+            principal_variation = [best_move]
+        principal_variation = principal_variation[:length]
+        for move in principal_variation:
+            game.apply_move(move, skip_legal_moves=True)
+        while len(principal_variation) < length and not game.is_finished():
+            entry = self.transposition_table.probe(game.hash())
+            if entry is None or entry.best_move is None or not game.is_legal_move(entry.best_move):
+                break
+            principal_variation.append(entry.best_move)
+            game.apply_move(entry.best_move, skip_legal_moves=True)
+        for _ in principal_variation:
+            game.unapply_last_move()
+        return principal_variation
+
+    def _search_aspiration_window(
+        self,
+        search_root,
+        game: Game,
+        depth: int,
+        hash_move: Move|None,
+        move_eval_callback
+    ) -> Tuple[Move, float]:
+        # Searches an iteration with a window around the score of the previous one,
+        # and again with the whole window if the score falls out of it.
+        if self.best_score is None or abs(self.best_score) == 1.0:
+            return search_root(game, depth, hash_move, move_eval_callback)
+        alpha = max(self.best_score - Engine.ASPIRATION_WINDOW, -1.1)
+        beta = min(self.best_score + Engine.ASPIRATION_WINDOW, 1.1)
+        best_move, score = search_root(game, depth, hash_move, move_eval_callback, alpha, beta)
+        if alpha < score < beta:
+            return best_move, score
+        return search_root(game, depth, best_move or hash_move, move_eval_callback)
+
+    def get_time_limit(
+        self,
+        move_time: float|None = None,
+        remaining_time: float|None = None,
+        increment: float = 0.0
+    ) -> float|None:
+        """
+        Returns the seconds get_best_move searches for with the given time
+        budget (see get_best_move), or None if it has no time limit.
+        """
+        time_limit = move_time
+        if remaining_time is not None:
+            clock_time_limit = min(
+                remaining_time / Engine.CLOCK_MOVES_TO_GO + increment * 0.8,
+                remaining_time * 0.8
+            )
+            time_limit = clock_time_limit if time_limit is None else min(time_limit, clock_time_limit)
+        return time_limit
+
+    def _search_root(
+        self,
+        game: Game,
+        depth: int,
+        hash_move: Move|None,
+        move_eval_callback,
+        alpha: float = -1.1,
+        beta: float = 1.1,
+        root_order_seed: int|None = None
+    ) -> Tuple[Move, float]:
+        # With root_order_seed, the root moves are searched in a random order
+        # (seeded by it) instead of the sorted one (see _search_root_lazy_smp).
+        if hash_move is None:
+            entry = self.transposition_table.probe(game.hash())
+            hash_move = entry.best_move if entry is not None else None
+        legal_moves = self._sort_legal_moves(game, hash_move)
+        if root_order_seed is not None:
+            Random(root_order_seed).shuffle(legal_moves)
+        window = alpha, beta
+        white_turn = game.turn == PieceColor.WHITE
+        self._principal_variations = [[]]
+        best_move = None
+        for index, move in enumerate(legal_moves):
+            game.apply_move(move, skip_legal_moves=True)
+            if index == 0:
+                score = self.evaluate_min_max(game, alpha, beta, depth)
+            else:
+                score, beats_bound = self._search_null_window(game, alpha, beta, depth, 0, white_turn)
+                if beats_bound:
+                    score = self.evaluate_min_max(game, alpha, beta, depth)
+            if move_eval_callback is not None:
+                move_eval_callback(len(legal_moves), move, score)
+            game.unapply_last_move()
+            if white_turn:
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    self._principal_variations[0] = [move] + self._principal_variations[1]
+            else: # black turn
+                if score < beta:
+                    beta = score
+                    best_move = move
+                    self._principal_variations[0] = [move] + self._principal_variations[1]
+            # Only with aspiration windows: the score is out of the window.
+            if beta <= alpha:
+                break
+        score = alpha if white_turn else beta
+        if window[0] < score < window[1]:
+            self.transposition_table.store(
+                game.hash(), depth + 1, score, BoundType.EXACT, best_move
+            )
+        return best_move, score
+
+    def _search_root_parallel(
+        self,
+        game: Game,
+        depth: int,
+        hash_move: Move|None,
+        move_eval_callback,
+        alpha: float = -1.1,
+        beta: float = 1.1
+    ) -> Tuple[Move, float]:
+        """
+        Like _search_root, but each root move is searched by a process of
+        the pool. Workers share the best score found so far, so the root
+        moves searched later are still pruned with it. The results are
+        combined in the original move order, so the best move and score
+        are the same as the serial search ones (except for the selective
+        search, that depends on the bound when each move is searched).
+        Root moves are not searched with null windows first.
+        """
+        if hash_move is None:
+            entry = self.transposition_table.probe(game.hash())
+            hash_move = entry.best_move if entry is not None else None
+        legal_moves = self._sort_legal_moves(game, hash_move)
+        executor = self._get_executor()
+        window = alpha, beta
+        self._shared_bound.value = alpha if game.turn == PieceColor.WHITE else beta
+        self._helpers_stop_flag.value = 1 if self._stop_flag.value else 0
+        futures = {
+            executor.submit(_search_root_move, game, move, depth, self._deadline, window): index
+            for index, move in enumerate(legal_moves)
+        }
+        scores = [None] * len(legal_moves)
+        principal_variations = [None] * len(legal_moves)
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                score, principal_variation, nodes, quiescence_nodes = future.result()
+                self.nodes += nodes
+                self.quiescence_nodes += quiescence_nodes
+                scores[index] = score
+                principal_variations[index] = principal_variation
                 if move_eval_callback is not None:
-                    move_eval_callback(len(legal_moves), move, score)
+                    move_eval_callback(len(legal_moves), legal_moves[index], score)
+        finally:
+            # On timeout, wait for the remaining searches to stop,
+            # so that they do not update the bound of the next search.
+            self._helpers_stop_flag.value = 1
+            for future in futures:
+                future.cancel()
+            wait(futures)
+        self._principal_variations = [[]]
+        best_move = None
+        for move, score, principal_variation in zip(legal_moves, scores, principal_variations):
+            if game.turn == PieceColor.WHITE:
                 if score > alpha:
                     alpha = score
                     best_move = move
-                game.unapply_last_move()
+                    self._principal_variations[0] = [move] + principal_variation
+            else: # game.turn == PieceColor.BLACK
+                if score < beta:
+                    beta = score
+                    best_move = move
+                    self._principal_variations[0] = [move] + principal_variation
+        score = alpha if game.turn == PieceColor.WHITE else beta
+        if window[0] < score < window[1]:
+            self.transposition_table.store(
+                game.hash(), depth + 1, score, BoundType.EXACT, best_move
+            )
+        return best_move, score
+
+    def _search_root_lazy_smp(
+        self,
+        game: Game,
+        depth: int,
+        hash_move: Move|None,
+        move_eval_callback,
+        alpha: float = -1.1,
+        beta: float = 1.1
+    ) -> Tuple[Move, float]:
+        """
+        Like _search_root, while workers - 1 helper processes search the same
+        position (with the whole window), half of them one ply deeper, and
+        each one with its own order of the root moves, seeded by its index,
+        so that they start on different subtrees than this process.
+        They only communicate through the shared transposition
+        table, where the results of the helpers let this process skip
+        subtrees. Helpers are stopped when this process finishes.
+        """
+        executor = self._get_executor()
+        self._helpers_stop_flag.value = 1 if self._stop_flag.value else 0
+        # Arguments are pickled by the pool later on, when this process
+        # is already applying moves to the game, so it is pickled now.
+        game_data = pickle.dumps(game)
+        futures = [
+            executor.submit(_search_lazy_smp_helper, game_data, depth + helper % 2, self._deadline, helper)
+            for helper in range(1, self.workers)
+        ]
+        try:
+            return self._search_root(game, depth, hash_move, move_eval_callback, alpha, beta)
+        finally:
+            self._helpers_stop_flag.value = 1
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            for future in futures:
+                if not future.cancelled():
+                    nodes, quiescence_nodes = future.result()
+                    self.nodes += nodes
+                    self.quiescence_nodes += quiescence_nodes
+
+    def start_workers(self) -> None:
+        """
+        Starts the worker processes of the parallel search, if any and
+        not started yet, and waits until all of them are ready to search.
+        get_best_move does it before its time budget starts, but the start
+        (i.e. of a new engine) takes long, so it is better done beforehand.
+        """
+        if self.workers > 1:
+            self._get_executor()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # The pool is kept between searches, so that the transposition
+        # tables and evaluation caches of the workers stay warm.
+        if self._executor is None:
+            started_workers = _WORKERS_CONTEXT.Value("i", 0)
+            if self.lazy_smp:
+                worker_count = self.workers - 1
+                self._helpers_stop_flag = _WORKERS_CONTEXT.Value("b", 0, lock=False)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=worker_count,
+                    mp_context=_WORKERS_CONTEXT,
+                    initializer=_init_lazy_smp_helper,
+                    initargs=(
+                        self._worker_settings, self._helpers_stop_flag, self.transposition_table, started_workers
+                    )
+                )
+            else:
+                worker_count = self.workers
+                self._helpers_stop_flag = _WORKERS_CONTEXT.Value("b", 0, lock=False)
+                self._shared_bound = _WORKERS_CONTEXT.Value("d", 0.0)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=worker_count,
+                    mp_context=_WORKERS_CONTEXT,
+                    initializer=_init_search_worker,
+                    initargs=(self._worker_settings, self._helpers_stop_flag, self._shared_bound, started_workers)
+                )
+            # Processes are started on demand, so the pool gets a task for each one,
+            # that waits for all of them: no process can take two of the tasks.
+            wait([self._executor.submit(_wait_for_workers, worker_count) for _ in range(worker_count)])
+        return self._executor
+
+    def evaluate_min_max(
+        self,
+        game: Game,
+        alpha: float,
+        beta: float,
+        depth: int,
+        ply: int = 1,
+        null_move: bool = True,
+        pv_node: bool = True
+    ) -> float:
+        """
+        Alpha-beta search of the game to depth. Unless disabled, out of check:
+        - Null-move pruning: if the side to move (with pieces other than pawns,
+          as pawn endings are prone to zugzwang) passes the turn, and a reduced
+          search still beats the bound of the other side, the node is cut off.
+        - Futility pruning: near the leaves, if the static evaluation is so far
+          from alpha (beta for black) that a quiet move is not expected to
+          reach it, quiet moves that do not check are not searched.
+        - Late move reductions: quiet moves that do not check, late in the
+          move order, are searched 1 ply shallower first, and only searched
+          to the full depth if that beats the bound.
+        Moves after the first one are searched with a null window first
+        (principal variation search), and, in nodes of the principal
+        variation (pv_node), searched again with the whole window if they
+        beat the bound. Nodes searched with a null window are not in it.
+        The principal variation of the node is left in the PV table, at
+        its ply.
+        """
+        self.nodes += 1
+        principal_variations = self._principal_variations
+        while len(principal_variations) <= ply + 1:
+            principal_variations.append([])
+        principal_variations[ply] = []
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise SearchTimeout()
+        if self._stop_flag.value:
+            raise SearchTimeout()
+        if game.is_finished():
+            return self.evaluate(game)
+        if depth == 0:
+            if self.quiescence_depth > 0:
+                return self.evaluate_quiescence(game, alpha, beta, self.quiescence_depth)
+            return self.evaluate(game)
+        position_hash = game.hash()
+        entry = self.transposition_table.probe(position_hash)
+        hash_move = None
+        if entry is not None:
+            if entry.depth >= depth:
+                if entry.bound == BoundType.EXACT:
+                    return entry.score
+                elif entry.bound == BoundType.LOWER:
+                    alpha = max(alpha, entry.score)
+                else: # entry.bound == BoundType.UPPER
+                    beta = min(beta, entry.score)
+                if beta <= alpha:
+                    return entry.score
+            hash_move = entry.best_move
+        futile = False
+        if not game.is_check:
+            if (
+                self.null_move_pruning and null_move and
+                depth >= Engine.NULL_MOVE_MIN_DEPTH and self._has_pieces(game)
+            ):
+                score = self._search_null_move(game, alpha, beta, depth, ply)
+                if score is not None:
+                    return score
+            if self.futility_pruning and depth < len(Engine.FUTILITY_MARGINS):
+                futile = self._is_futile(game, alpha, beta, depth)
+        original_alpha, original_beta = alpha, beta
+        best_move = None
+        if game.turn == PieceColor.WHITE:
+            for index, move in enumerate(self._get_ordered_moves(game, hash_move, ply)):
+                score = self._search_move(game, move, index, alpha, beta, depth, ply, futile, pv_node)
+                if score is None:
+                    continue
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    principal_variations[ply] = [move] + principal_variations[ply + 1]
+                if beta <= alpha:
+                    self._store_cutoff(game, move, depth, ply)
+                    break
+            score = alpha
         else: # game.turn == PieceColor.BLACK
-            for move in legal_moves:
-                game.apply_move(move)
-                score = self.evaluate_min_max(game, alpha, beta, self.min_max_depth)
-                if move_eval_callback is not None:
-                    move_eval_callback(len(legal_moves), move, score)
+            for index, move in enumerate(self._get_ordered_moves(game, hash_move, ply)):
+                score = self._search_move(game, move, index, alpha, beta, depth, ply, futile, pv_node)
+                if score is None:
+                    continue
                 if score < beta:
                     beta = score
                     best_move = move
+                    principal_variations[ply] = [move] + principal_variations[ply + 1]
+                if beta <= alpha:
+                    self._store_cutoff(game, move, depth, ply)
+                    break
+            score = beta
+        if score <= original_alpha:
+            bound = BoundType.UPPER
+        elif score >= original_beta:
+            bound = BoundType.LOWER
+        else:
+            bound = BoundType.EXACT
+        self.transposition_table.store(
+            position_hash, depth, score, bound, best_move or hash_move
+        )
+        return score
+
+    def _search_move(
+        self,
+        game: Game,
+        move: Move,
+        index: int,
+        alpha: float,
+        beta: float,
+        depth: int,
+        ply: int,
+        futile: bool,
+        pv_node: bool
+    ) -> float|None:
+        # Searches a move of the position at depth (see evaluate_min_max),
+        # given its index in the move order and whether the position is a node of
+        # the principal variation. Returns None if it is pruned.
+        white_turn = game.turn == PieceColor.WHITE
+        in_check = game.is_check
+        game.apply_move(move, skip_legal_moves=True)
+        search_depth = depth - 1
+        if type(move) not in [Capture, PromotionCapture, EnPassantCapture, Promotion] and not game.is_check:
+            if futile:
                 game.unapply_last_move()
-        return best_move
+                return None
+            if (
+                self.late_move_reductions and not in_check and
+                depth >= Engine.LATE_MOVE_MIN_DEPTH and index >= Engine.LATE_MOVE_MIN_INDEX
+            ):
+                search_depth = depth - 2
+        if index == 0:
+            score = self.evaluate_min_max(game, alpha, beta, search_depth, ply + 1, pv_node=pv_node)
+        else:
+            score, beats_bound = self._search_null_window(game, alpha, beta, search_depth, ply, white_turn)
+            if beats_bound and search_depth < depth - 1:
+                score, beats_bound = self._search_null_window(game, alpha, beta, depth - 1, ply, white_turn)
+            if beats_bound and pv_node:
+                score = self.evaluate_min_max(game, alpha, beta, depth - 1, ply + 1)
+        game.unapply_last_move()
+        return score
 
-    def evaluate_min_max(self, game: Game, alpha: float, beta: float, depth: int) -> float:
-        if game.is_finished() or depth == 0:
+    def _search_null_window(
+        self,
+        game: Game,
+        alpha: float,
+        beta: float,
+        depth: int,
+        ply: int,
+        white_turn: bool
+    ) -> Tuple[float, bool]:
+        # Searches the position after a move with a null window at the bound of the
+        # side that moved. Returns the score, and whether it beats the bound.
+        if white_turn:
+            score = self.evaluate_min_max(game, alpha, alpha + Engine.NULL_WINDOW, depth, ply + 1, pv_node=False)
+            return score, score > alpha
+        else: # black turn
+            score = self.evaluate_min_max(game, beta - Engine.NULL_WINDOW, beta, depth, ply + 1, pv_node=False)
+            return score, score < beta
+
+    def _search_null_move(self, game: Game, alpha: float, beta: float, depth: int, ply: int) -> float|None:
+        # Returns the bound to cut off with, if passing the turn already beats it.
+        depth = depth - 1 - Engine.NULL_MOVE_REDUCTION
+        if game.turn == PieceColor.WHITE:
+            if self.evaluate(game) < beta:
+                return None
+            game.apply_null_move()
+            score = self.evaluate_min_max(game, beta - Engine.NULL_WINDOW, beta, depth, ply + 1, False, pv_node=False)
+            game.unapply_last_move()
+            return beta if score >= beta else None
+        else: # game.turn == PieceColor.BLACK
+            if self.evaluate(game) > alpha:
+                return None
+            game.apply_null_move()
+            score = self.evaluate_min_max(game, alpha, alpha + Engine.NULL_WINDOW, depth, ply + 1, False, pv_node=False)
+            game.unapply_last_move()
+            return alpha if score <= alpha else None
+
+    def _has_pieces(self, game: Game) -> bool:
+        # Pieces other than the king and pawns, of the side to move.
+        return game.board.get_material_points(game.turn) > game.board.get_bitboard(Pawn, game.turn).bit_count()
+
+    def _is_futile(self, game: Game, alpha: float, beta: float, depth: int) -> bool:
+        # The margin is the material score of the margin points, that depends
+        # on the material left (see eval_material), plus the most a quiet move
+        # can change the other evaluation terms.
+        board = game.board
+        white_points = board.get_material_points(PieceColor.WHITE)
+        black_points = board.get_material_points(PieceColor.BLACK)
+        if white_points + black_points == 0:
+            return False
+        if game.turn == PieceColor.WHITE:
+            position_points = board.get_position_points(PieceColor.WHITE), board.get_position_points(PieceColor.BLACK)
+        else: # game.turn == PieceColor.BLACK
+            position_points = board.get_position_points(PieceColor.BLACK), board.get_position_points(PieceColor.WHITE)
+        margin = (
+            Engine.FUTILITY_MARGINS[depth] / (white_points + black_points) * 2 * MATERIAL_WEIGHT +
+            _get_score_change(*position_points, Engine.FUTILITY_POSITION_POINTS) * POSITION_WEIGHT +
+            Engine.FUTILITY_CENTER_CONTROL * CENTER_CONTROL_WEIGHT
+        )
+        if game.turn == PieceColor.WHITE:
+            return self.evaluate(game) + margin <= alpha
+        else: # game.turn == PieceColor.BLACK
+            return self.evaluate(game) - margin >= beta
+
+    def evaluate_quiescence(self, game: Game, alpha: float, beta: float, depth: int) -> float:
+        """
+        Extends the search at the leaves with captures and promotions only,
+        until the position is quiet or depth runs out. The side to move can
+        always stand pat with the static evaluation, unless it is in check:
+        then all the evasions are searched.
+        """
+        self.quiescence_nodes += 1
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise SearchTimeout()
+        if self._stop_flag.value:
+            raise SearchTimeout()
+        if game.is_finished():
             return self.evaluate(game)
-        legal_moves = self._sort_legal_moves(game)
+        if game.is_check:
+            if depth == 0:
+                return self.evaluate(game)
+            moves = self._sort_legal_moves(game)
+        else:
+            stand_pat = self.evaluate(game)
+            if game.turn == PieceColor.WHITE:
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha, stand_pat)
+            else: # game.turn == PieceColor.BLACK
+                if stand_pat <= alpha:
+                    return stand_pat
+                beta = min(beta, stand_pat)
+            if depth == 0:
+                return alpha if game.turn == PieceColor.WHITE else beta
+            # Captures that lose material by static exchange evaluation are pruned.
+            moves, _ = self._sort_captures(game, game.legal_captures())
         if game.turn == PieceColor.WHITE:
-            for move in legal_moves:
-                game.apply_move(move)
-                alpha = max(alpha, self.evaluate_min_max(game, alpha, beta, depth - 1))
+            for move in moves:
+                game.apply_move(move, skip_legal_moves=True)
+                alpha = max(alpha, self.evaluate_quiescence(game, alpha, beta, depth - 1))
                 game.unapply_last_move()
                 if beta <= alpha:
                     break
             return alpha
         else: # game.turn == PieceColor.BLACK
-            for move in legal_moves:
-                game.apply_move(move)
-                beta = min(beta, self.evaluate_min_max(game, alpha, beta, depth - 1))
+            for move in moves:
+                game.apply_move(move, skip_legal_moves=True)
+                beta = min(beta, self.evaluate_quiescence(game, alpha, beta, depth - 1))
                 game.unapply_last_move()
                 if beta <= alpha:
                     break
             return beta
-        
-    def _sort_legal_moves(self, game: Game) -> List[Move]:
-        legal_moves = game.legal_moves()
-        shuffle(legal_moves)
-        scored_legal_moves = []
-        for move in legal_moves:
-            if type(move) in [Capture, PromotionCapture, EnPassantCapture]:
-                score = 4
-            elif self._is_threatening(game, move):
-                score = 3
-            elif self._is_forward(game, move):
-                score = 2
+
+    def _sort_legal_moves(self, game: Game, hash_move: Move|None = None) -> List[Move]:
+        return list(self._get_ordered_moves(game, hash_move))
+
+    def _get_ordered_moves(
+        self,
+        game: Game,
+        hash_move: Move|None = None,
+        ply: int|None = None
+    ) -> Iterator[Move]:
+        # The moves of each stage are only generated (and sorted) if the
+        # search did not cut off before reaching it. Captures that lose
+        # material are searched last, after the quiet moves.
+        losing_captures = []
+        for stage, moves in game.get_staged_moves(hash_move):
+            if stage == MoveStage.HASH_MOVE:
+                yield from moves
+            elif stage == MoveStage.CAPTURES:
+                captures, losing_captures = self._sort_captures(game, moves)
+                yield from captures
+            else: # stage == MoveStage.QUIET_MOVES
+                yield from self._sort_quiet_moves(game, moves, ply)
+        yield from losing_captures
+
+    def _sort_captures(self, game: Game, moves: List[Move]) -> Tuple[List[Move], List[Move]]:
+        """
+        Sorts captures and promotions by most valuable victim (including
+        the promotion gain), then least valuable attacker. Returns the ones
+        that do not lose material by static exchange evaluation, and then
+        the ones that do, separately.
+        """
+        scored_captures = []
+        scored_losing_captures = []
+        for move in moves:
+            if type(move) == EnPassantCapture:
+                victim_points = MATERIAL_POINTS[Pawn]
             else:
-                score = 1
-            scored_legal_moves.append((move, score))
-        sorted_legal_moves = sorted(scored_legal_moves, key=lambda x: -x[1])
-        return [m for m, _ in sorted_legal_moves]
-    
-    def _is_threatening(self, game: Game, move: Move) -> bool:
-        if type(move) == Castling:
-            castling_coords = game.get_castling_coords(move.mode)
-            piece = game.board.get_piece_at(castling_coords["rook_origin"])
-            threat_coords = piece.get_destinations(castling_coords["rook_origin"])
-        else:
-            piece = game.board.get_piece_at(move.origin)
-            if type(piece) == Pawn:
-                threat_coords = piece.get_destinations(move.destination, capture=True)
+                victim = game.board.get_piece_at(move.destination)
+                victim_points = MATERIAL_POINTS[type(victim)] if victim is not None else 0
+            attacker_points = MATERIAL_POINTS[type(game.board.get_piece_at(move.origin))]
+            if type(move) in [Promotion, PromotionCapture]:
+                victim_points += MATERIAL_POINTS[move.promote_to] - MATERIAL_POINTS[Pawn]
+                attacker_points = MATERIAL_POINTS[move.promote_to]
+            score = victim_points * 10 - attacker_points
+            # Only worth evaluating if the moved piece is worth more than what it wins.
+            if attacker_points > victim_points and game.static_exchange_evaluation(move) < 0:
+                scored_losing_captures.append((move, score))
             else:
-                threat_coords = piece.get_destinations(move.destination)
-        for threat_coord_path in threat_coords:
-            for threat_coord in threat_coord_path:
-                threatened_piece = game.board.get_piece_at(threat_coord)
-                if threatened_piece is not None:
-                    if threatened_piece.color == game.turn:
-                        break
-                    else:
-                        return True                
-        return False
+                scored_captures.append((move, score))
+        scored_captures.sort(key=lambda x: x[1], reverse=True)
+        scored_losing_captures.sort(key=lambda x: x[1], reverse=True)
+        return [m for m, _ in scored_captures], [m for m, _ in scored_losing_captures]
+
+    def _sort_quiet_moves(self, game: Game, moves: List[Move], ply: int|None = None) -> List[Move]:
+        """
+        Sorts the killer moves of the ply (if given) first, then the rest
+        by history, and by the position points they gain on ties (i.e.
+        before the history has any cutoffs). The order is deterministic.
+        """
+        killer_moves = self._killer_moves[ply] if ply is not None and ply < len(self._killer_moves) else []
+        scored_moves = []
+        for move in moves:
+            if move in killer_moves:
+                score = (1, -killer_moves.index(move), 0)
+            else:
+                history = self._history.get(self._get_history_key(game, move), 0)
+                score = (0, history, self._get_position_points_gain(game, move))
+            scored_moves.append((move, score))
+        # Stable, so moves with the same score keep the generation order.
+        scored_moves.sort(key=lambda x: x[1], reverse=True)
+        return [m for m, _ in scored_moves]
 
-    def _is_forward(self, game: Game, move: Move) -> bool:
+    def _get_position_points_gain(self, game: Game, move: Move) -> int:
         if type(move) == Castling:
-            return False
-        if game.turn == PieceColor.WHITE:
-            return move.destination.rank > move.origin.rank
-        else: # game.turn == PieceColor.BLACK
-            return move.destination.rank < move.origin.rank
+            return 0
+        position_points = POSITION_POINTS[(type(game.board.get_piece_at(move.origin)), game.turn)]
+        return position_points[move.destination.index] - position_points[move.origin.index]
+
+    def _store_cutoff(self, game: Game, move: Move, depth: int, ply: int) -> None:
+        # Only quiet moves are killers or get history: captures and
+        # promotions are sorted by their material.
+        if type(move) in [Capture, PromotionCapture, EnPassantCapture, Promotion]:
+            return
+        while len(self._killer_moves) <= ply:
+            self._killer_moves.append([])
+        killer_moves = self._killer_moves[ply]
+        if move not in killer_moves:
+            killer_moves.insert(0, move)
+            del killer_moves[2:]
+        key = self._get_history_key(game, move)
+        # Cutoffs far from the leaves save more nodes, so they weigh more.
+        self._history[key] = self._history.get(key, 0) + depth * depth
+
+    def _get_history_key(self, game: Game, move: Move) -> Tuple[type, PieceColor, int]:
+        if type(move) == Castling:
+            return King, game.turn, game.get_castling_coords(move.mode)["king_destination"].index
+        return type(game.board.get_piece_at(move.origin)), game.turn, move.destination.index
 
     def evaluate(self, game: Game) -> float:
         if game.is_finished():
@@ -112,8 +919,133 @@ class Engine:
                 return -1.0
             else:
                 return 0.0
-        return sum([
-            eval_material(game) * 0.85,
-            eval_position(game) * 0.1,
-            eval_center_control(game) * 0.05
-        ])
+        if self.tablebases is not None:
+            result = self.tablebases.probe(game)
+            if result is not None:
+                # Wins and losses are scored as checkmates.
+                return float(result[0] if game.turn == PieceColor.WHITE else -result[0])
+        position_hash = game.hash()
+        score = self.evaluation_cache.get(position_hash)
+        if score is None:
+            score = sum([
+                eval_material(game) * MATERIAL_WEIGHT,
+                eval_position(game) * POSITION_WEIGHT,
+                eval_center_control(game) * CENTER_CONTROL_WEIGHT
+            ])
+            self.evaluation_cache.put(position_hash, score)
+        return score
+
+
+def _get_score_change(points: int, other_points: int, change: int) -> float:
+    # Largest change of a score computed as the evaluation functions do (the
+    # share of the points of a side, from -1 to 1) when the points of the side
+    # change by up to change, either way.
+    scores = []
+    for new_points in [max(points - change, 0), points, points + change]:
+        total_points = new_points + other_points
+        scores.append(float(new_points) / total_points * 2 - 1 if total_points != 0 else 0.0)
+    return max(scores[2] - scores[1], scores[1] - scores[0])
+
+
+# Engine and shared bound of each process of the root-parallel search pool,
+# and the number of processes of its pool that are ready.
+_worker_engine = None
+_worker_bound = None
+_started_workers = None
+
+
+def _init_search_worker(engine_settings: dict, stop_flag, shared_bound, started_workers) -> None:
+    global _worker_engine, _worker_bound
+    _worker_engine = Engine(**engine_settings)
+    _worker_engine._stop_flag = stop_flag
+    _worker_bound = shared_bound
+    _set_worker_started(started_workers)
+
+
+def _set_worker_started(started_workers) -> None:
+    global _started_workers
+    _started_workers = started_workers
+    with started_workers.get_lock():
+        started_workers.value += 1
+
+
+def _wait_for_workers(worker_count: int) -> None:
+    while _started_workers.value < worker_count:
+        time.sleep(0.001)
+
+
+def _search_root_move(
+    game: Game,
+    move: Move,
+    depth: int,
+    deadline: float|None,
+    window: Tuple[float, float]
+) -> Tuple[float, List[Move], int, int]:
+    """
+    Searches a root move in a worker process, within the window of the
+    root search. Returns its score, the principal variation after it
+    and the number of nodes and quiescence nodes searched.
+    """
+    engine = _worker_engine
+    engine.nodes = 0
+    engine.quiescence_nodes = 0
+    engine._deadline = deadline
+    turn = game.turn
+    alpha, beta = window
+    if turn == PieceColor.WHITE:
+        alpha = _worker_bound.value
+    else: # turn == PieceColor.BLACK
+        beta = _worker_bound.value
+    game.apply_move(move, skip_legal_moves=True)
+    try:
+        score = engine.evaluate_min_max(game, alpha, beta, depth)
+    finally:
+        engine._deadline = None
+    with _worker_bound.get_lock():
+        if turn == PieceColor.WHITE:
+            if score > _worker_bound.value:
+                _worker_bound.value = score
+        else: # turn == PieceColor.BLACK
+            if score < _worker_bound.value:
+                _worker_bound.value = score
+    return score, engine._principal_variations[1], engine.nodes, engine.quiescence_nodes
+
+
+def _init_lazy_smp_helper(
+    engine_settings: dict,
+    stop_flag,
+    transposition_table: SharedTranspositionTable,
+    started_workers
+) -> None:
+    global _worker_engine
+    # The shared table replaces the helper's own, so it is not allocated.
+    _worker_engine = Engine(**dict(engine_settings, transposition_table_mb=0))
+    _worker_engine.transposition_table = transposition_table
+    _worker_engine._stop_flag = stop_flag
+    _set_worker_started(started_workers)
+
+
+def _search_lazy_smp_helper(
+    game_data: bytes,
+    depth: int,
+    deadline: float|None,
+    helper: int
+) -> Tuple[int, int]:
+    """
+    Searches the root position in a Lazy SMP helper process (the given
+    helper index, that seeds its order of the root moves), until it
+    finishes or it is stopped. Returns the number of nodes and quiescence
+    nodes searched.
+    """
+    engine = _worker_engine
+    engine.nodes = 0
+    engine.quiescence_nodes = 0
+    engine._deadline = deadline
+    game = pickle.loads(game_data)
+    try:
+        engine._search_root(game, depth, None, None, root_order_seed=helper)
+    except SearchTimeout:
+        pass
+    finally:
+        engine._deadline = None
+    return engine.nodes, engine.quiescence_nodes
@@ -1,113 +1,30 @@
 
-from aboveboard.coord import Coord
+from aboveboard.bitboard import get_piece_attacks, iterate_bits, square_index
 from aboveboard.piece import King, Queen, Rook, Bishop, Knight, Pawn, PieceColor
 from aboveboard.game import Game
+from aboveboard.points import (
+    MATERIAL_POINTS, KING_POSITION_POINTS, QUEEN_POSITION_POINTS, ROOK_POSITION_POINTS,
+    BISHOP_POSITION_POINTS, KNIGHT_POSITION_POINTS, PAWN_POSITION_POINTS
+)
+
+
+# Weights of the evaluation functions in the score of a position (Engine.evaluate).
+MATERIAL_WEIGHT = 0.85
+POSITION_WEIGHT = 0.1
+CENTER_CONTROL_WEIGHT = 0.05
 
 
-MATERIAL_POINTS = {
-    King: 0,
-    Queen: 9,
-    Rook: 5,
-    Bishop: 3,
-    Knight: 3,
-    Pawn: 1
-}
 def eval_material(game: Game) -> float:
-    white_points = sum([
-        MATERIAL_POINTS[type(p)] for p in game.board.get_pieces(PieceColor.WHITE)
-    ])
-    black_points = sum([
-        MATERIAL_POINTS[type(p)] for p in game.board.get_pieces(PieceColor.BLACK)
-    ])
+    white_points = game.board.get_material_points(PieceColor.WHITE)
+    black_points = game.board.get_material_points(PieceColor.BLACK)
     if white_points + black_points == 0:
         return 0.0
     return (float(white_points) / (white_points + black_points)) * 2 - 1
 
 
-KING_POSITION_POINTS = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 1, 2, 2, 1, 0, 0],
-    [0, 0, 1, 2, 2, 1, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 1, 0, 0, 0, 0, 1, 0]
-]
-QUEEN_POSITION_POINTS = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0]
-]
-ROOK_POSITION_POINTS = [
-    [1, 1, 1, 1, 1, 1, 1, 1],
-    [2, 2, 2, 3, 3, 2, 2, 2],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 1, 1, 1, 1, 0, 0],
-    [0, 0, 2, 3, 3, 2, 0, 0]
-]
-BISHOP_POSITION_POINTS = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [1, 0, 1, 0, 0, 1, 0, 1],
-    [0, 2, 1, 1, 1, 1, 2, 0],
-    [2, 1, 2, 1, 1, 2, 1, 2],
-    [1, 2, 1, 1, 1, 1, 2, 1],
-    [1, 3, 0, 1, 1, 0, 3, 1],
-    [1, 0, 1, 0, 0, 1, 0, 1]
-]
-KNIGHT_POSITION_POINTS = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 1, 2, 2, 2, 2, 1, 0],
-    [0, 2, 2, 2, 2, 2, 2, 0],
-    [0, 1, 2, 2, 2, 2, 1, 0],
-    [0, 1, 2, 1, 1, 2, 1, 0],
-    [0, 0, 0, 1, 1, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0]
-]
-PAWN_POSITION_POINTS = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [3, 3, 3, 3, 3, 3, 3, 3],
-    [2, 2, 2, 2, 2, 2, 2, 2],
-    [1, 1, 1, 1, 1, 1, 1, 1],
-    [0, 0, 0, 3, 3, 0, 0, 0],
-    [0, 1, 0, 1, 1, 0, 1, 0],
-    [1, 1, 1, 0, 0, 1, 1, 1],
-    [0, 0, 0, 0, 0, 0, 0, 0]
-]
 def eval_position(game: Game) -> float:
-    white_points, black_points = 0, 0
-    for file in range(8):
-        for rank in range(8):
-            piece = game.board.get_piece_at(Coord(file, rank))
-            if piece is not None:
-                if piece.color == PieceColor.WHITE:
-                    rank = 7 - rank
-                if type(piece) == King:
-                    points = KING_POSITION_POINTS[rank][file]
-                elif type(piece) == Queen:
-                    points = QUEEN_POSITION_POINTS[rank][file]
-                elif type(piece) == Rook:
-                    points = ROOK_POSITION_POINTS[rank][file]
-                elif type(piece) == Bishop:
-                    points = BISHOP_POSITION_POINTS[rank][file]
-                elif type(piece) == Knight:
-                    points = KNIGHT_POSITION_POINTS[rank][file]
-                else: # type(piece) == Pawn
-                    points = PAWN_POSITION_POINTS[rank][file]
-                if piece.color == PieceColor.WHITE:
-                    white_points += points
-                else: # piece.color == PieceColor.BLACK
-                    black_points += points
+    white_points = game.board.get_position_points(PieceColor.WHITE)
+    black_points = game.board.get_position_points(PieceColor.BLACK)
     if white_points + black_points == 0:
         return 0.0
     return (float(white_points) / (white_points + black_points)) * 2 - 1
@@ -131,25 +48,40 @@ CENTER_CONTROL_FACTORS = {
     Knight: 3,
     Pawn: 4
 }
+def _build_center_control_levels() -> list:
+    # A square worth N points is in the first N masks, so the points of a set
+    # of squares are the sum of the number of its squares in each mask.
+    max_points = max(max(row) for row in CENTER_CONTROL_POINTS)
+    levels = []
+    for level in range(1, max_points + 1):
+        mask = 0
+        for rank in range(8):
+            for file in range(8):
+                if CENTER_CONTROL_POINTS[rank][file] >= level:
+                    mask |= 1 << square_index(file, rank)
+        levels.append(mask)
+    return levels
+
+
+CENTER_CONTROL_LEVELS = _build_center_control_levels()
+def _get_center_control_points(game: Game, color: PieceColor, occupancy: int) -> int:
+    # The squares a piece controls are its attacks: all its destinations,
+    # up to and including the first piece found on each path.
+    points = 0
+    for piece_type, piece_factor in CENTER_CONTROL_FACTORS.items():
+        for index in iterate_bits(game.board.get_bitboard(piece_type, color)):
+            attacks = get_piece_attacks(piece_type, color, index, occupancy)
+            attacks_points = 0
+            for level in CENTER_CONTROL_LEVELS:
+                attacks_points += (attacks & level).bit_count()
+            points += attacks_points * piece_factor
+    return points
+
+
 def eval_center_control(game: Game) -> float:
-    white_points, black_points = 0, 0
-    for piece in game.board.get_pieces():
-        piece_factor = CENTER_CONTROL_FACTORS[type(piece)]
-        origin = game.board.get_piece_coord(piece)
-        if type(piece) == Pawn:
-            destinations = piece.get_destinations(origin, capture=True)
-        else:
-            destinations = piece.get_destinations(origin)
-        for destination_path in destinations:
-            for destination in destination_path:
-                destination_piece = game.board.get_piece_at(destination)
-                destination_points = CENTER_CONTROL_POINTS[destination.rank][destination.file]
-                if piece.color == PieceColor.WHITE:
-                    white_points += destination_points * piece_factor
-                else: # piece.color == PieceColor.BLACK
-                    black_points += destination_points * piece_factor
-                if destination_piece is not None:
-                    break
+    occupancy = game.board.get_occupancy()
+    white_points = _get_center_control_points(game, PieceColor.WHITE, occupancy)
+    black_points = _get_center_control_points(game, PieceColor.BLACK, occupancy)
     if white_points + black_points == 0:
         return 0.0
     return (float(white_points) / (white_points + black_points)) * 2 - 1
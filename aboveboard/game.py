@@ -1,25 +1,288 @@
 
-from aboveboard.board import Board
+from aboveboard.bitboard import (
+    ALL_SQUARES, BETWEEN, BISHOP_DIRECTIONS, PAWN_ATTACKS, ROOK_DIRECTIONS,
+    get_piece_attacks, get_ray_attacks, iterate_bits
+)
+from aboveboard.board import Board, FIGURE_TYPES
 from aboveboard.coord import Coord
 from aboveboard.move import (
     Move, RegularMove, Capture, EnPassantCapture,
     Promotion, PromotionCapture, Castling, CastlingMode
 )
-from aboveboard.piece import King, Queen, Rook, Bishop, Knight, Pawn, Piece, PieceColor
+from aboveboard.piece import King, Queen, Rook, Bishop, Knight, Pawn, PieceColor
+from aboveboard.points import MATERIAL_POINTS
+from aboveboard.zobrist import BLACK_TURN_KEY, CASTLING_KEYS, EN_PASSANT_KEYS
 from collections import defaultdict
-from typing import Dict, List
+from enum import Enum
+from typing import Dict, Iterator, List, Tuple
+
+
+CASTLING_RIGHTS = {
+    (PieceColor.WHITE, CastlingMode.SHORT): 1,
+    (PieceColor.WHITE, CastlingMode.LONG): 2,
+    (PieceColor.BLACK, CastlingMode.SHORT): 4,
+    (PieceColor.BLACK, CastlingMode.LONG): 8
+}
+ALL_CASTLING_RIGHTS = 15
+# Castling rights that are lost when a move starts or ends in a given square
+# (the king or one of the rooks moves, or a rook is captured).
+CASTLING_RIGHTS_LOST = [0] * 64
+CASTLING_RIGHTS_LOST[4] = 1 | 2
+CASTLING_RIGHTS_LOST[7] = 1
+CASTLING_RIGHTS_LOST[0] = 2
+CASTLING_RIGHTS_LOST[60] = 4 | 8
+CASTLING_RIGHTS_LOST[63] = 4
+CASTLING_RIGHTS_LOST[56] = 8
+
+
+def _build_castling_coords(color: PieceColor, mode: CastlingMode) -> Dict[str, Coord]:
+    king_origin = Coord(4, 0 if color == PieceColor.WHITE else 7)
+    if mode == CastlingMode.SHORT:
+        king_destination = Coord(6, king_origin.rank)
+        rook_origin = Coord(7, king_origin.rank)
+        rook_destination = Coord(5, king_origin.rank)
+        rook_extra_path = None
+    else: # mode == CastlingMode.LONG
+        king_destination = Coord(2, king_origin.rank)
+        rook_origin = Coord(0, king_origin.rank)
+        rook_destination = Coord(3, king_origin.rank)
+        rook_extra_path = Coord(1, king_origin.rank)
+    return {
+        "king_origin": king_origin,
+        "king_destination": king_destination,
+        "rook_origin": rook_origin,
+        "rook_destination": rook_destination,
+        "rook_extra_path": rook_extra_path
+    }
+
+
+CASTLING_COORDS = {
+    (color, mode): _build_castling_coords(color, mode)
+    for color in [PieceColor.WHITE, PieceColor.BLACK]
+    for mode in [CastlingMode.SHORT, CastlingMode.LONG]
+}
+
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+# Black pieces are lowercase, and white pieces uppercase.
+FEN_PIECE_TYPES = {
+    "k": King,
+    "q": Queen,
+    "r": Rook,
+    "b": Bishop,
+    "n": Knight,
+    "p": Pawn
+}
+FEN_CASTLING_RIGHTS = {
+    "K": CASTLING_RIGHTS[(PieceColor.WHITE, CastlingMode.SHORT)],
+    "Q": CASTLING_RIGHTS[(PieceColor.WHITE, CastlingMode.LONG)],
+    "k": CASTLING_RIGHTS[(PieceColor.BLACK, CastlingMode.SHORT)],
+    "q": CASTLING_RIGHTS[(PieceColor.BLACK, CastlingMode.LONG)]
+}
+
+
+# Material points of the pieces in exchanges. Capturing the king ends the exchange:
+# the capture before it was illegal, so it is worth more than any other material.
+EXCHANGE_POINTS = dict(MATERIAL_POINTS)
+EXCHANGE_POINTS[King] = 100
+# Pieces by exchange points, as the least valuable attacker recaptures first.
+EXCHANGE_ORDER = [Pawn, Knight, Bishop, Rook, Queen, King]
+
+
+class MoveStage(Enum):
+    HASH_MOVE = 1
+    CAPTURES = 2
+    QUIET_MOVES = 3
+
+
+class _LegalMoves:
+    """
+    Legal moves of a position. Each group is generated on first access.
+    Captures include en passant captures and all promotions.
+    The king safety data (see Game._get_king_safety) is computed once,
+    and shared by both groups.
+    """
+
+    __slots__ = ("captures", "quiet_moves", "all", "king_safety")
+
+    def __init__(self):
+        self.captures = None
+        self.quiet_moves = None
+        self.all = None
+        self.king_safety = None
 
 
 class Game:
 
     def __init__(self):
-        self.board = Board()
-        self.turn = PieceColor.WHITE
-        self.is_check = False
+        self._setup(Board(), PieceColor.WHITE, ALL_CASTLING_RIGHTS, None, 0, 1)
+
+    def _setup(
+        self,
+        board: Board,
+        turn: PieceColor,
+        castling_rights: int,
+        en_passant_target: Coord|None,
+        halfmove_clock: int,
+        fullmove_number: int
+    ) -> None:
+        self.board = board
+        self.turn = turn
         self._move_history = []
+        self._castling_rights = [castling_rights]
+        self._en_passant_targets = [en_passant_target]
+        # Moves since the last capture or pawn move.
+        self._halfmove_clocks = [halfmove_clock]
+        # The fullmove number is incremented after each black move.
+        self._first_fullmove_number = fullmove_number
+        self._first_turn_offset = 0 if turn == PieceColor.WHITE else 1
+        self._hashes = [self._compute_hash()]
         self._repeated_positions = defaultdict(int)
-        self._repeated_positions[self.board.to_string()] += 1
-        self._legal_moves = [self._get_legal_moves()]
+        self._repeated_positions[self.hash()] += 1
+        self._legal_moves = [_LegalMoves()]
+        king_piece = self.board.get_king(self.turn)
+        self.is_check = self._is_attacked(self.board.get_piece_coord(king_piece), self.turn)
+
+    @classmethod
+    def from_fen(cls, fen: str):
+        """
+        Returns a Game that starts in the position described by the given
+        FEN string, without move history. The halfmove clock and fullmove
+        number fields are optional (they default to 0 and 1).
+        Castling rights whose king or rook are not in their initial
+        squares are dropped.
+        """
+        fields = fen.split()
+        if len(fields) not in [4, 6]:
+            raise Exception(f"Invalid FEN {fen}.")
+        if len(fields) == 4:
+            fields += ["0", "1"]
+        placement, turn_code, castling_code, en_passant_code, halfmove_code, fullmove_code = fields
+
+        board = Board(empty=True)
+        rank_codes = placement.split("/")
+        if len(rank_codes) != 8:
+            raise Exception(f"Invalid FEN piece placement {placement}.")
+        for rank, rank_code in zip(range(7, -1, -1), rank_codes):
+            file = 0
+            for code in rank_code:
+                if code in "12345678":
+                    file += int(code)
+                    continue
+                piece_type = FEN_PIECE_TYPES.get(code.lower())
+                if piece_type is None or file > 7:
+                    raise Exception(f"Invalid FEN piece placement {placement}.")
+                color = PieceColor.WHITE if code.isupper() else PieceColor.BLACK
+                board.set_piece_at(piece_type(color), Coord(file, rank))
+                file += 1
+            if file != 8:
+                raise Exception(f"Invalid FEN piece placement {placement}.")
+        for color in [PieceColor.WHITE, PieceColor.BLACK]:
+            if board.get_bitboard(King, color).bit_count() != 1:
+                raise Exception(f"Invalid FEN piece placement {placement}.")
+
+        if turn_code not in ["w", "b"]:
+            raise Exception(f"Invalid FEN side to move {turn_code}.")
+        turn = PieceColor.WHITE if turn_code == "w" else PieceColor.BLACK
+
+        castling_rights = 0
+        if castling_code != "-":
+            for code in castling_code:
+                if code not in FEN_CASTLING_RIGHTS:
+                    raise Exception(f"Invalid FEN castling rights {castling_code}.")
+                castling_rights |= FEN_CASTLING_RIGHTS[code]
+        for (color, mode), castling_right in CASTLING_RIGHTS.items():
+            coords = CASTLING_COORDS[(color, mode)]
+            king_piece = board.get_piece_at(coords["king_origin"])
+            rook_piece = board.get_piece_at(coords["rook_origin"])
+            if (
+                type(king_piece) != King or king_piece.color != color or
+                type(rook_piece) != Rook or rook_piece.color != color
+            ):
+                castling_rights &= ~castling_right
+
+        en_passant_target = None
+        if en_passant_code != "-":
+            en_passant_target = Coord.from_notation(en_passant_code)
+            # The pawn that just moved two squares must be in front of the target.
+            pawn_rank = 4 if turn == PieceColor.WHITE else 3
+            pawn_piece = board.get_piece_at(Coord(en_passant_target.file, pawn_rank))
+            if (
+                en_passant_target.rank != (5 if turn == PieceColor.WHITE else 2) or
+                type(pawn_piece) != Pawn or pawn_piece.color == turn or
+                board.get_piece_at(en_passant_target) is not None
+            ):
+                raise Exception(f"Invalid FEN en passant target {en_passant_code}.")
+
+        if not halfmove_code.isdigit() or not fullmove_code.isdigit() or int(fullmove_code) < 1:
+            raise Exception(f"Invalid FEN move counters {halfmove_code} {fullmove_code}.")
+
+        game = cls.__new__(cls)
+        game._setup(
+            board, turn, castling_rights, en_passant_target, int(halfmove_code), int(fullmove_code)
+        )
+        other_king_piece = board.get_king(game._get_other_turn())
+        if game._is_attacked(board.get_piece_coord(other_king_piece), other_king_piece.color):
+            raise Exception(f"Invalid FEN {fen}: the side not to move is in check.")
+        return game
+
+    def to_fen(self) -> str:
+        """
+        Returns the FEN string of the current position. The en passant
+        target is included after every two squares pawn move.
+        """
+        fen_codes = {piece_type: code for code, piece_type in FEN_PIECE_TYPES.items()}
+        rank_codes = []
+        for rank in range(7, -1, -1):
+            rank_code = ""
+            empty_squares = 0
+            for file in range(8):
+                piece = self.board.get_piece_at(Coord(file, rank))
+                if piece is None:
+                    empty_squares += 1
+                    continue
+                if empty_squares > 0:
+                    rank_code += str(empty_squares)
+                    empty_squares = 0
+                code = fen_codes[type(piece)]
+                rank_code += code.upper() if piece.color == PieceColor.WHITE else code
+            if empty_squares > 0:
+                rank_code += str(empty_squares)
+            rank_codes.append(rank_code)
+        castling_code = "".join(
+            code for code, castling_right in FEN_CASTLING_RIGHTS.items()
+            if self._castling_rights[-1] & castling_right
+        )
+        en_passant_target = self._en_passant_targets[-1]
+        return " ".join([
+            "/".join(rank_codes),
+            "w" if self.turn == PieceColor.WHITE else "b",
+            castling_code or "-",
+            en_passant_target.to_string() if en_passant_target is not None else "-",
+            str(self.get_halfmove_clock()),
+            str(self.get_fullmove_number())
+        ])
+
+    def _compute_hash(self) -> int:
+        position_hash = self.board.hash() ^ CASTLING_KEYS[self._castling_rights[-1]]
+        if self.turn == PieceColor.BLACK:
+            position_hash ^= BLACK_TURN_KEY
+        # The en passant file is only hashed if some pawn can actually capture.
+        en_passant_target = self._en_passant_targets[-1]
+        if (
+            en_passant_target is not None and
+            PAWN_ATTACKS[self._get_other_turn()][en_passant_target.index] &
+            self.board.get_bitboard(Pawn, self.turn)
+        ):
+            position_hash ^= EN_PASSANT_KEYS[en_passant_target.file]
+        return position_hash
+
+    def hash(self) -> int:
+        """
+        Zobrist hash of the current position. Covers piece placement,
+        side to move, castling rights and en passant file.
+        """
+        return self._hashes[-1]
 
     def _get_other_turn(self) -> PieceColor:
         if self.turn == PieceColor.WHITE:
@@ -28,67 +291,16 @@ class Game:
             return PieceColor.WHITE
 
     def _is_attacked(self, coord: Coord, color: PieceColor) -> bool:
-        for piece_type in [King, Queen, Rook, Bishop, Knight]:
-            attacking_piece = piece_type(color)
-            destinations = attacking_piece.get_destinations(coord)
-            for destination_path in destinations:
-                for destination in destination_path:
-                    destination_piece = self.board.get_piece_at(destination)
-                    if destination_piece is None:
-                        continue
-                    elif (
-                        destination_piece.color != color and
-                        type(destination_piece) == piece_type
-                    ):
-                        return True
-                    else:
-                        break
-        pawn_rank = coord.rank + 1 if color == PieceColor.WHITE else coord.rank - 1
-        for pawn_file in [coord.file - 1, coord.file + 1]:
-            try:
-                pawn_coord = Coord(pawn_file, pawn_rank)
-            except Exception:
-                continue
-            pawn = self.board.get_piece_at(pawn_coord)
-            if (
-                pawn is not None and
-                pawn.color != color and
-                type(pawn) == Pawn
-            ):
-                return True
-        return False
-    
-    def _piece_has_moved(self, piece: Piece) -> bool:
-        for _, moved_pieces, _, _ in self._move_history:
-            if piece in moved_pieces:
-                return True
-        return False
+        other_color = PieceColor.BLACK if color == PieceColor.WHITE else PieceColor.WHITE
+        return self.board.is_attacked_by(coord.index, other_color)
     
     def _can_capture_en_passant(self, destination: Coord) -> bool:
-        if len(self._move_history) == 0:
-            return False
-        if destination.rank != (5 if self.turn == PieceColor.WHITE else 2):
-            return False
-        last_move, moved_pieces, _, _ = self._move_history[-1]
-        if type(last_move) == Castling:
-            return False
-        piece = moved_pieces[0]
-        return (
-            type(piece) == Pawn and
-            last_move.origin.file == destination.file and
-            last_move.origin.rank == (1 if piece.color == PieceColor.WHITE else 6) and
-            last_move.destination.file == destination.file and
-            last_move.destination.rank == (3 if piece.color == PieceColor.WHITE else 4)
-        )
+        return destination is self._en_passant_targets[-1]
 
     def _can_castle(self, mode: CastlingMode) -> bool:
-        castling_coords = self.get_castling_coords(mode)
-        king = self.board.get_piece_at(castling_coords["king_origin"])
-        if king is None or type(king) != King or self._piece_has_moved(king):
-            return False
-        rook = self.board.get_piece_at(castling_coords["rook_origin"])
-        if rook is None or type(rook) != Rook or self._piece_has_moved(rook):
+        if not self._castling_rights[-1] & CASTLING_RIGHTS[(self.turn, mode)]:
             return False
+        castling_coords = self.get_castling_coords(mode)
         if self._is_attacked(castling_coords["king_origin"], self.turn):
             return False
         for coord in [castling_coords["rook_destination"], castling_coords["king_destination"]]:
@@ -114,120 +326,336 @@ class Game:
                 return False
         return True
 
-    def _get_legal_pawn_moves(self) -> List[Move]:
-        last_rank = 7 if self.turn == PieceColor.WHITE else 0
+    def _get_legal_pawn_moves(self, captures: bool) -> List[Move]:
+        if self.turn == PieceColor.WHITE:
+            push_inc, start_rank, last_rank = 8, 1, 7
+        else: # self.turn == PieceColor.BLACK
+            push_inc, start_rank, last_rank = -8, 6, 0
+        occupancy = self.board.get_occupancy()
+        enemy_occupancy = self.board.get_occupancy(self._get_other_turn())
+        pawn_attacks = PAWN_ATTACKS[self.turn]
         legal_moves = []
-        for pawn in self.board.get_pawns(self.turn):
-            origin = self.board.get_piece_coord(pawn)
-            # Get legal non-capture moves
-            destinations = pawn.get_destinations(origin, capture=False)
-            for destination_path in destinations:
-                for destination in destination_path:
-                    destination_piece = self.board.get_piece_at(destination)
-                    if destination_piece is None:
-                        if destination.rank == last_rank:
-                            # Promotion
-                            for promote_to in [Queen, Rook, Bishop, Knight]:
-                                move = Promotion(origin, destination, promote_to)
-                                legal_moves.append(move)
-                        else:
-                            # RegularMove
-                            move = RegularMove(origin, destination)
+        for origin_index in iterate_bits(self.board.get_bitboard(Pawn, self.turn)):
+            origin = Coord.from_index(origin_index)
+            # Get legal non-capture moves (promotions go with the captures)
+            destination_index = origin_index + push_inc
+            if 0 <= destination_index < 64 and not occupancy & (1 << destination_index):
+                destination = Coord.from_index(destination_index)
+                if destination.rank == last_rank:
+                    if captures:
+                        # Promotion
+                        for promote_to in [Queen, Rook, Bishop, Knight]:
+                            move = Promotion(origin, destination, promote_to)
                             legal_moves.append(move)
-                    else:
-                        break
+                elif not captures:
+                    # RegularMove
+                    move = RegularMove(origin, destination)
+                    legal_moves.append(move)
+                    destination_index += push_inc
+                    if origin.rank == start_rank and not occupancy & (1 << destination_index):
+                        destination = Coord.from_index(destination_index)
+                        move = RegularMove(origin, destination)
+                        legal_moves.append(move)
+            if not captures:
+                continue
             # Get legal capture moves
-            destinations = pawn.get_destinations(origin, capture=True)
-            for destination_path in destinations:
-                for destination in destination_path:
+            for destination_index in iterate_bits(pawn_attacks[origin_index]):
+                destination = Coord.from_index(destination_index)
+                if not enemy_occupancy & (1 << destination_index):
                     if self._can_capture_en_passant(destination):
                         # EnPassantCapture
                         move = EnPassantCapture(origin, destination)
                         legal_moves.append(move)
-                    else:
-                        captured_piece = self.board.get_piece_at(destination)
-                        if captured_piece is None or captured_piece.color == pawn.color:
-                            break
-                        elif destination.rank == last_rank:
-                            # PromotionCapture
-                            for promote_to in [Queen, Rook, Bishop, Knight]:
-                                move = PromotionCapture(origin, destination, promote_to)
-                                legal_moves.append(move)
-                        else:
-                            # Capture
-                            move = Capture(origin, destination)
-                            legal_moves.append(move)
+                elif destination.rank == last_rank:
+                    # PromotionCapture
+                    for promote_to in [Queen, Rook, Bishop, Knight]:
+                        move = PromotionCapture(origin, destination, promote_to)
+                        legal_moves.append(move)
+                else:
+                    # Capture
+                    move = Capture(origin, destination)
+                    legal_moves.append(move)
         return legal_moves
 
-    def _get_legal_figure_moves(self) -> List[Move]:
+    def _get_legal_figure_moves(self, captures: bool) -> List[Move]:
+        occupancy = self.board.get_occupancy()
+        own_occupancy = self.board.get_occupancy(self.turn)
+        enemy_occupancy = occupancy ^ own_occupancy
+        target_occupancy = enemy_occupancy if captures else ~occupancy
+        move_type = Capture if captures else RegularMove
         legal_moves = []
-        for figure in self.board.get_figures(self.turn):
-            origin = self.board.get_piece_coord(figure)
-            destinations = figure.get_destinations(origin)
-            for destination_path in destinations:
-                for destination in destination_path:
-                    captured_piece = self.board.get_piece_at(destination)
-                    if captured_piece is None:
-                        # RegularMove
-                        move = RegularMove(origin, destination)
-                        legal_moves.append(move)
-                    elif captured_piece.color != self.turn:
-                        # Capture
-                        move = Capture(origin, destination)
-                        legal_moves.append(move)
-                        break
-                    else:
-                        break
+        for figure_type in FIGURE_TYPES:
+            bitboard = self.board.get_bitboard(figure_type, self.turn)
+            for origin_index in iterate_bits(bitboard):
+                origin = Coord.from_index(origin_index)
+                destinations = get_piece_attacks(
+                    figure_type, self.turn, origin_index, occupancy
+                ) & target_occupancy
+                for destination_index in iterate_bits(destinations):
+                    destination = Coord.from_index(destination_index)
+                    move = move_type(origin, destination)
+                    legal_moves.append(move)
         return legal_moves
 
-    def _get_legal_moves(self) -> List[Move]:
-        legal_move_candidates = []
-        legal_move_candidates.extend(self._get_legal_pawn_moves())
-        legal_move_candidates.extend(self._get_legal_figure_moves())
-        # Discard moves that leave king in check
+    def _leaves_king_in_check(self, move: Move) -> bool:
         king_piece = self.board.get_king(self.turn)
-        legal_moves = []
-        for move in legal_move_candidates:
-            self.apply_move(move, skip_legal_moves=True)
-            king_coord = self.board.get_piece_coord(king_piece)
-            leaves_king_in_check = self._is_attacked(king_coord, king_piece.color)
-            self.unapply_last_move(skip_legal_moves=True)
-            if not leaves_king_in_check:
-                legal_moves.append(move)
-        # Add legal castling moves
-        for mode in [CastlingMode.SHORT, CastlingMode.LONG]:
-            if self._can_castle(mode):
-                move = Castling(mode)
-                legal_moves.append(move)
-        return legal_moves
-    
+        self.apply_move(move, skip_legal_moves=True)
+        king_coord = self.board.get_piece_coord(king_piece)
+        leaves_king_in_check = self._is_attacked(king_coord, king_piece.color)
+        self.unapply_last_move()
+        return leaves_king_in_check
+
+    def _is_pseudo_legal(self, move: Move) -> bool:
+        """
+        Returns True if the given move could be generated in the current
+        position, regardless of whether it leaves the king in check.
+        """
+        move_type = type(move)
+        if move_type == Castling:
+            return self._can_castle(move.mode)
+        piece = self.board.get_piece_at(move.origin)
+        if piece is None or piece.color != self.turn:
+            return False
+        destination_mask = 1 << move.destination.index
+        if move_type == EnPassantCapture:
+            return (
+                type(piece) == Pawn and
+                self._can_capture_en_passant(move.destination) and
+                PAWN_ATTACKS[self.turn][move.origin.index] & destination_mask != 0
+            )
+        is_capture = move_type in [Capture, PromotionCapture]
+        captured_piece = self.board.get_piece_at(move.destination)
+        if is_capture != (captured_piece is not None):
+            return False
+        if captured_piece is not None and captured_piece.color == self.turn:
+            return False
+        if type(piece) != Pawn:
+            if move_type not in [RegularMove, Capture]:
+                return False
+            occupancy = self.board.get_occupancy()
+            attacks = get_piece_attacks(type(piece), self.turn, move.origin.index, occupancy)
+            return attacks & destination_mask != 0
+        last_rank = 7 if self.turn == PieceColor.WHITE else 0
+        if (move.destination.rank == last_rank) != (move_type in [Promotion, PromotionCapture]):
+            return False
+        if is_capture:
+            return PAWN_ATTACKS[self.turn][move.origin.index] & destination_mask != 0
+        if move.destination.file != move.origin.file:
+            return False
+        push_inc = 1 if self.turn == PieceColor.WHITE else -1
+        if move.destination.rank == move.origin.rank + push_inc:
+            return True
+        start_rank = 1 if self.turn == PieceColor.WHITE else 6
+        return (
+            move.origin.rank == start_rank and
+            move.destination.rank == move.origin.rank + push_inc * 2 and
+            self.board.get_piece_at(Coord(move.origin.file, move.origin.rank + push_inc)) is None
+        )
+
+    def _get_king_safety(self) -> Tuple[int, int, Dict[int, int]]:
+        """
+        Returns the index of the king of the side to move, a mask of the squares
+        a non-king move must go to in order to stop a check (all squares if not
+        in check, none if in double check), and the masks of the squares each
+        pinned piece can move to (along the line between the king and the pinner).
+        """
+        legal_moves = self._legal_moves[-1]
+        if legal_moves.king_safety is not None:
+            return legal_moves.king_safety
+        other_turn = self._get_other_turn()
+        king_bitboard = self.board.get_bitboard(King, self.turn)
+        king_index = king_bitboard.bit_length() - 1
+        checkers = self.board.get_attackers(king_index, other_turn)
+        if checkers == 0:
+            check_mask = ALL_SQUARES
+        elif checkers & (checkers - 1) == 0:
+            check_mask = checkers | BETWEEN[king_index][checkers.bit_length() - 1]
+        else: # double check
+            check_mask = 0
+        # Enemy sliders aligned with the king, looking through own pieces
+        own_occupancy = self.board.get_occupancy(self.turn)
+        enemy_occupancy = self.board.get_occupancy(other_turn)
+        enemy_queens = self.board.get_bitboard(Queen, other_turn)
+        pinners = (
+            get_ray_attacks(king_index, enemy_occupancy, ROOK_DIRECTIONS) &
+            (self.board.get_bitboard(Rook, other_turn) | enemy_queens) |
+            get_ray_attacks(king_index, enemy_occupancy, BISHOP_DIRECTIONS) &
+            (self.board.get_bitboard(Bishop, other_turn) | enemy_queens)
+        )
+        pin_masks = {}
+        for pinner_index in iterate_bits(pinners):
+            between = BETWEEN[king_index][pinner_index]
+            pinned = between & own_occupancy
+            if pinned != 0 and pinned & (pinned - 1) == 0:
+                pin_masks[pinned.bit_length() - 1] = between | (1 << pinner_index)
+        legal_moves.king_safety = (king_index, check_mask, pin_masks)
+        return legal_moves.king_safety
+
+    def _keeps_king_safe(self, move: Move) -> bool:
+        """
+        Returns True if the given pseudo-legal move (not a castling)
+        does not leave the king in check.
+        """
+        king_index, check_mask, pin_masks = self._get_king_safety()
+        origin_index = move.origin.index
+        if origin_index == king_index:
+            # The king can not move to attacked squares, including the ones
+            # behind it on the line of a slider that gives check.
+            occupancy = self.board.get_occupancy() ^ (1 << king_index)
+            attackers = self.board.get_attackers(
+                move.destination.index, self._get_other_turn(), occupancy
+            )
+            return attackers == 0
+        if type(move) == EnPassantCapture:
+            # Removes 2 pieces from the same rank, so do it the slow way.
+            return not self._leaves_king_in_check(move)
+        destination_mask = 1 << move.destination.index
+        return (
+            destination_mask & check_mask != 0 and
+            destination_mask & pin_masks.get(origin_index, ALL_SQUARES) != 0
+        )
+
+    def _filter_legal_moves(self, legal_move_candidates: List[Move]) -> List[Move]:
+        # Discard moves that leave king in check
+        return [m for m in legal_move_candidates if self._keeps_king_safe(m)]
+
+    def _get_legal_captures(self) -> List[Move]:
+        legal_moves = self._legal_moves[-1]
+        if legal_moves.captures is None:
+            legal_moves.captures = self._filter_legal_moves(
+                self._get_legal_pawn_moves(captures=True) +
+                self._get_legal_figure_moves(captures=True)
+            )
+        return legal_moves.captures
+
+    def _get_legal_quiet_moves(self) -> List[Move]:
+        legal_moves = self._legal_moves[-1]
+        if legal_moves.quiet_moves is None:
+            quiet_moves = self._filter_legal_moves(
+                self._get_legal_pawn_moves(captures=False) +
+                self._get_legal_figure_moves(captures=False)
+            )
+            # Add legal castling moves
+            for mode in [CastlingMode.SHORT, CastlingMode.LONG]:
+                if self._can_castle(mode):
+                    move = Castling(mode)
+                    quiet_moves.append(move)
+            legal_moves.quiet_moves = quiet_moves
+        return legal_moves.quiet_moves
+
+    def _has_legal_moves(self) -> bool:
+        return len(self._get_legal_captures()) > 0 or len(self._get_legal_quiet_moves()) > 0
+
     def get_castling_coords(self, mode) -> Dict[str, Coord]:
-        king_origin = Coord(4, 0 if self.turn == PieceColor.WHITE else 7)
-        if mode == CastlingMode.SHORT:
-            king_destination = Coord(6, king_origin.rank)
-            rook_origin = Coord(7, king_origin.rank)
-            rook_destination = Coord(5, king_origin.rank)
-            rook_extra_path = None
-        else: # mode == CastlingMode.LONG
-            king_destination = Coord(2, king_origin.rank)
-            rook_origin = Coord(0, king_origin.rank)
-            rook_destination = Coord(3, king_origin.rank)
-            rook_extra_path = Coord(1, king_origin.rank)
-        return {
-            "king_origin": king_origin,
-            "king_destination": king_destination,
-            "rook_origin": rook_origin,
-            "rook_destination": rook_destination,
-            "rook_extra_path": rook_extra_path
-        }
+        return CASTLING_COORDS[(self.turn, mode)]
+
+    def get_move_history(self) -> List[Move]:
+        return [move for move, _, _, _ in self._move_history]
+
+    def get_castling_rights(self) -> int:
+        """
+        Returns the castling rights left, as a combination of FEN_CASTLING_RIGHTS.
+        """
+        return self._castling_rights[-1]
+
+    def get_halfmove_clock(self) -> int:
+        return self._halfmove_clocks[-1]
+
+    def get_fullmove_number(self) -> int:
+        return self._first_fullmove_number + (len(self._move_history) + self._first_turn_offset) // 2
 
     def legal_moves(self) -> List[Move]:
-        return self._legal_moves[-1]
+        legal_moves = self._legal_moves[-1]
+        if legal_moves.all is None:
+            legal_moves.all = self._get_legal_captures() + self._get_legal_quiet_moves()
+        return legal_moves.all
+
+    def legal_captures(self) -> List[Move]:
+        """
+        Legal captures of the position, including en passant captures
+        and promotions (the moves that change the material balance).
+        """
+        return self._get_legal_captures()
+
+    def is_legal_move(self, move: Move) -> bool:
+        legal_moves = self._legal_moves[-1]
+        if legal_moves.all is not None:
+            return move in legal_moves.all
+        if type(move) == Castling:
+            return self._can_castle(move.mode)
+        return self._is_pseudo_legal(move) and self._keeps_king_safe(move)
+
+    def static_exchange_evaluation(self, move: Move) -> int:
+        """
+        Returns the material points the side to move wins (or loses, if
+        negative) with the given legal move and the exchange of captures
+        that may follow on its destination, where each side recaptures
+        with its least valuable attacker (including the ones behind other
+        attackers), and stops when recapturing does not pay. Pins and
+        checks are ignored. Quiet moves only risk the moved piece.
+        """
+        if type(move) == Castling:
+            return 0
+        board = self.board
+        index = move.destination.index
+        occupancy = board.get_occupancy() ^ (1 << move.origin.index)
+        if type(move) == EnPassantCapture:
+            captured_points = EXCHANGE_POINTS[Pawn]
+            occupancy ^= 1 << Coord(move.destination.file, move.origin.rank).index
+        else:
+            captured_piece = board.get_piece_at(move.destination)
+            captured_points = EXCHANGE_POINTS[type(captured_piece)] if captured_piece is not None else 0
+        if type(move) in [Promotion, PromotionCapture]:
+            captured_points += EXCHANGE_POINTS[move.promote_to] - EXCHANGE_POINTS[Pawn]
+            piece_points = EXCHANGE_POINTS[move.promote_to]
+        else:
+            piece_points = EXCHANGE_POINTS[type(board.get_piece_at(move.origin))]
+        # Points won by the side that captures at each step, if the exchange ended there.
+        gains = [captured_points]
+        color = self._get_other_turn()
+        while True:
+            attackers = board.get_attackers(index, color, occupancy)
+            if not attackers:
+                break
+            for piece_type in EXCHANGE_ORDER:
+                piece_attackers = attackers & board.get_bitboard(piece_type, color)
+                if piece_attackers:
+                    break
+            gains.append(piece_points - gains[-1])
+            piece_points = EXCHANGE_POINTS[piece_type]
+            occupancy ^= piece_attackers & -piece_attackers
+            color = PieceColor.BLACK if color == PieceColor.WHITE else PieceColor.WHITE
+        # Each side only captures if it does not lose more than stopping.
+        for step in range(len(gains) - 1, 0, -1):
+            gains[step - 1] = min(gains[step - 1], -gains[step])
+        return gains[0]
+
+    def get_staged_moves(
+        self,
+        hash_move: Move|None = None
+    ) -> Iterator[Tuple[MoveStage, List[Move]]]:
+        """
+        Yields the legal moves in stages: the given hash move (if legal),
+        then captures (and promotions), then quiet moves. The moves of a
+        stage are only generated when the previous stage has been consumed,
+        so consumers that stop early save the rest of the generation.
+        """
+        if hash_move is not None and self.is_legal_move(hash_move):
+            yield MoveStage.HASH_MOVE, [hash_move]
+            yield MoveStage.CAPTURES, [m for m in self._get_legal_captures() if m != hash_move]
+            yield MoveStage.QUIET_MOVES, [m for m in self._get_legal_quiet_moves() if m != hash_move]
+        else:
+            yield MoveStage.CAPTURES, self._get_legal_captures()
+            yield MoveStage.QUIET_MOVES, self._get_legal_quiet_moves()
 
     def apply_move(self, move: Move, skip_legal_moves: bool = False) -> None:
+        """
+        Applies the given move, after checking that it is legal, unless
+        skip_legal_moves is True (i.e. the move was taken from the legal moves).
+        """
         if not skip_legal_moves and self.is_finished():
             raise Exception("Can not apply moves after game is finished.")
-        if not skip_legal_moves and move not in self.legal_moves():
+        if not skip_legal_moves and not self.is_legal_move(move):
             raise Exception(f"{move.to_string()} is not a legal move.")
         moved_pieces = []
         
@@ -257,25 +685,83 @@ class Game:
             else:
                 self.board.set_piece_at(piece, move.destination)
 
+        castling_rights = self._castling_rights[-1]
+        if type(move) == Castling:
+            castling_rights &= ~(
+                CASTLING_RIGHTS[(self.turn, CastlingMode.SHORT)] |
+                CASTLING_RIGHTS[(self.turn, CastlingMode.LONG)]
+            )
+        else: # type(move) != Castling
+            castling_rights &= ~(
+                CASTLING_RIGHTS_LOST[move.origin.index] |
+                CASTLING_RIGHTS_LOST[move.destination.index]
+            )
+        self._castling_rights.append(castling_rights)
+        en_passant_target = None
+        if (
+            type(move) == RegularMove and
+            type(moved_pieces[0]) == Pawn and
+            abs(move.destination.rank - move.origin.rank) == 2
+        ):
+            en_passant_target = Coord(
+                move.origin.file, (move.origin.rank + move.destination.rank) // 2
+            )
+        self._en_passant_targets.append(en_passant_target)
+        if captured_piece is not None or type(moved_pieces[0]) == Pawn:
+            self._halfmove_clocks.append(0)
+        else:
+            self._halfmove_clocks.append(self._halfmove_clocks[-1] + 1)
+
         self._move_history.append([move, moved_pieces, captured_piece, promoted_piece])
         self.turn = self._get_other_turn()
         king_piece = self.board.get_king(self.turn)
         king_coord = self.board.get_piece_coord(king_piece)
         self.is_check = self._is_attacked(king_coord, king_piece.color)
-        self._repeated_positions[self.board.to_string()] += 1
-        if not skip_legal_moves:
-            self._legal_moves.append(self._get_legal_moves())
+        position_hash = self._compute_hash()
+        self._hashes.append(position_hash)
+        self._repeated_positions[position_hash] += 1
+        self._legal_moves.append(_LegalMoves())
 
+    def apply_null_move(self) -> None:
+        """
+        Passes the turn without moving, which is not a legal move, but lets
+        the search find out what the other side threatens. Can not be done
+        in check. It is undone with unapply_last_move, and it is in the move
+        history as None until then. The position it leads to does not count
+        for repetitions.
+        """
+        if self.is_check:
+            raise Exception("Can not pass the turn in check.")
+        self._castling_rights.append(self._castling_rights[-1])
+        self._en_passant_targets.append(None)
+        self._halfmove_clocks.append(self._halfmove_clocks[-1] + 1)
+        self._move_history.append([None, [], None, None])
+        self.turn = self._get_other_turn()
+        # The king of the other side can not be attacked, or the position was illegal.
+        self.is_check = False
+        self._hashes.append(self._compute_hash())
+        self._legal_moves.append(_LegalMoves())
 
-    def unapply_last_move(self, skip_legal_moves: bool = False) -> Move:
+    def unapply_last_move(self, skip_legal_moves: bool = False) -> Move|None:
+        """
+        Undoes the last move (or null move), and returns it (None for null
+        moves). skip_legal_moves is ignored: the legal moves of every
+        position are kept lazily (see _LegalMoves), so there is nothing to skip.
+        It is accepted for compatibility with existing callers.
+        """
         last_move, _, captured_piece, promoted_piece = self._move_history.pop(-1)
-        board_hash = self.board.to_string()
-        self._repeated_positions[board_hash] -= 1
-        if self._repeated_positions[board_hash] == 0:
-            del self._repeated_positions[board_hash]
-        if not skip_legal_moves:
-            self._legal_moves.pop(-1)
+        self._castling_rights.pop(-1)
+        self._en_passant_targets.pop(-1)
+        self._halfmove_clocks.pop(-1)
+        position_hash = self._hashes.pop(-1)
+        self._legal_moves.pop(-1)
         self.turn = self._get_other_turn()
+        if last_move is None: # null move
+            self.is_check = False
+            return None
+        self._repeated_positions[position_hash] -= 1
+        if self._repeated_positions[position_hash] == 0:
+            del self._repeated_positions[position_hash]
 
         if type(last_move) == Castling:
             coords = self.get_castling_coords(last_move.mode)
@@ -299,11 +785,12 @@ class Game:
         king_piece = self.board.get_king(self.turn)
         king_coord = self.board.get_piece_coord(king_piece)
         self.is_check = self._is_attacked(king_coord, king_piece.color)
+        return last_move
 
     def is_finished(self) -> bool:
         return (
-            len(self.legal_moves()) == 0 or
-            max(self._repeated_positions.values()) >= 3 or
+            self._repeated_positions.get(self.hash(), 0) >= 3 or
+            not self._has_legal_moves() or
             self._is_insufficient_material()
         )
 
@@ -311,7 +798,7 @@ class Game:
         if not self.is_finished():
             raise Exception("Game is not finished.")
         if (
-            max(self._repeated_positions.values()) >= 3 or
+            self._repeated_positions.get(self.hash(), 0) >= 3 or
             self._is_insufficient_material()
         ):
             return None
@@ -37,6 +37,33 @@ class Move(ABC):
                 continue
             return move
         raise Exception(f"Invalid notation {notation}.")
+
+    @classmethod
+    def from_code(cls, code: int):
+        """
+        Returns the Move represented by a code returned by to_code.
+        """
+        origin = Coord.from_index(code & 0x3f)
+        destination = Coord.from_index((code >> 6) & 0x3f)
+        move_type, argument = _MOVE_CODE_TYPES[code >> 12]
+        if move_type == Castling:
+            return Castling(argument)
+        if argument is not None:
+            return move_type(origin, destination, argument)
+        return move_type(origin, destination)
+
+    def to_code(self) -> int:
+        """
+        Returns a 16 bit integer that represents the move, so that it can
+        be stored in binary formats: the origin index in the 6 lowest bits,
+        then the destination index, and the kind of move in the 4 highest.
+        Castlings have origin and destination 0. Code 0 is never a move.
+        """
+        if type(self) == Castling:
+            return _MOVE_CODE_KINDS[(Castling, self.mode)] << 12
+        argument = getattr(self, "promote_to", None)
+        kind = _MOVE_CODE_KINDS[(type(self), argument)]
+        return (kind << 12) | (self.destination.index << 6) | self.origin.index
     
     def __eq__(self, other) -> bool:
         """
@@ -247,3 +274,22 @@ class Castling(Move):
             return "O-O"
         else: # self.mode == CastlingMode.LONG
             return "O-O-O"
+
+
+# Kinds of move of the 4 highest bits of move codes.
+_MOVE_CODE_TYPES = [
+    (RegularMove, None),
+    (Capture, None),
+    (EnPassantCapture, None),
+    (Promotion, Queen),
+    (Promotion, Rook),
+    (Promotion, Bishop),
+    (Promotion, Knight),
+    (PromotionCapture, Queen),
+    (PromotionCapture, Rook),
+    (PromotionCapture, Bishop),
+    (PromotionCapture, Knight),
+    (Castling, CastlingMode.SHORT),
+    (Castling, CastlingMode.LONG)
+]
+_MOVE_CODE_KINDS = {move_code_type: kind for kind, move_code_type in enumerate(_MOVE_CODE_TYPES)}
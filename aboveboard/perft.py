@@ -0,0 +1,106 @@
+from aboveboard.game import Game
+from aboveboard.move import Move
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+import pickle
+import time
+
+
+# Standard perft test positions, and their known
+# leaf node counts at each depth (from depth 0).
+PERFT_POSITIONS = {
+    "start": {
+        "fen": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        "nodes": [1, 20, 400, 8902, 197281, 4865609, 119060324]
+    },
+    "kiwipete": {
+        "fen": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        "nodes": [1, 48, 2039, 97862, 4085603, 193690690]
+    },
+    "position3": {
+        "fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        "nodes": [1, 14, 191, 2812, 43238, 674624, 11030083]
+    },
+    "position4": {
+        "fen": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        "nodes": [1, 6, 264, 9467, 422333, 15833292]
+    },
+    "position5": {
+        "fen": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        "nodes": [1, 44, 1486, 62379, 2103487, 89941194]
+    }
+}
+
+
+def perft(game: Game, depth: int) -> int:
+    """
+    Returns the number of leaf nodes of the legal move tree of the game
+    down to depth. Game end rules other than checkmate and stalemate
+    (repetitions, insufficient material) are ignored, as usual in perft.
+    """
+    if depth == 0:
+        return 1
+    legal_moves = game.legal_moves()
+    if depth == 1:
+        return len(legal_moves)
+    nodes = 0
+    for move in legal_moves:
+        game.apply_move(move, skip_legal_moves=True)
+        nodes += perft(game, depth - 1)
+        game.unapply_last_move()
+    return nodes
+
+
+def divide(game: Game, depth: int, processes: int = 1) -> List[Tuple[Move, int]]:
+    """
+    Returns the perft leaf node count of each legal move of the game,
+    for the given depth (including the move). With processes > 1,
+    the subtrees of the moves are counted by a process pool.
+    """
+    if depth == 0:
+        return []
+    legal_moves = list(game.legal_moves())
+    if processes <= 1:
+        move_nodes = []
+        for move in legal_moves:
+            game.apply_move(move, skip_legal_moves=True)
+            move_nodes.append((move, perft(game, depth - 1)))
+            game.unapply_last_move()
+        return move_nodes
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = []
+        for move in legal_moves:
+            # Arguments are pickled by the pool later on,
+            # so the game is pickled while the move is applied.
+            game.apply_move(move, skip_legal_moves=True)
+            futures.append(executor.submit(_perft_subtree, pickle.dumps(game), depth - 1))
+            game.unapply_last_move()
+        return [(move, future.result()) for move, future in zip(legal_moves, futures)]
+
+
+def _perft_subtree(game_data: bytes, depth: int) -> int:
+    return perft(pickle.loads(game_data), depth)
+
+
+def run_perft(position: str, depth: int, processes: int = 1) -> dict:
+    """
+    Runs perft on one of the PERFT_POSITIONS. Returns the divide counts
+    (in notation), the total nodes, the reference count (None if unknown
+    for that depth), the time taken and the nodes per second.
+    """
+    perft_position = PERFT_POSITIONS[position]
+    game = Game.from_fen(perft_position["fen"])
+    start_time = time.monotonic()
+    move_nodes = divide(game, depth, processes)
+    nodes = sum(n for _, n in move_nodes) if depth > 0 else 1
+    total_time = time.monotonic() - start_time
+    reference_nodes = perft_position["nodes"]
+    return {
+        "position": position,
+        "depth": depth,
+        "divide": [(move.to_string(), n) for move, n in move_nodes],
+        "nodes": nodes,
+        "expected_nodes": reference_nodes[depth] if depth < len(reference_nodes) else None,
+        "time": total_time,
+        "nps": nodes / total_time if total_time > 0 else 0.0
+    }
@@ -2,29 +2,62 @@
 from abc import ABC
 from aboveboard.coord import Coord
 from enum import Enum
-from typing import List
+from typing import List, Tuple
 
 
 class PieceColor(Enum):
     WHITE = 1
     BLACK = 2
 
+    # Members are singletons, so identity hashing is enough,
+    # and it is much cheaper than Enum's name-based hash.
+    __hash__ = object.__hash__
+
+
+# Destination paths from a given origin (see Piece.get_destinations).
+Destinations = Tuple[Tuple[Coord, ...], ...]
+
+
+def _build_destinations(destinations_map: List[Tuple[int, int]], sliding: bool) -> List[Destinations]:
+    """
+    Precomputes the destination paths for all 64 origins, indexed by
+    rank * 8 + file. Sliding pieces keep moving in each direction
+    until the end of the board, the others do only one step.
+    """
+    all_destinations = []
+    for index in range(64):
+        destinations = []
+        for file_inc, rank_inc in destinations_map:
+            destination_path = []
+            file, rank = index % 8 + file_inc, index // 8 + rank_inc
+            while file >= 0 and file < 8 and rank >= 0 and rank < 8:
+                destination_path.append(Coord(file, rank))
+                if not sliding:
+                    break
+                file, rank = file + file_inc, rank + rank_inc
+            if len(destination_path) > 0:
+                destinations.append(tuple(destination_path))
+        all_destinations.append(tuple(destinations))
+    return all_destinations
+
 
 class Piece(ABC):
 
     def __init__(self, color: PieceColor):
         self.color = color
 
-    def get_destinations(self, origin: Coord) -> List[List[Coord]]:
+    def get_destinations(self, origin: Coord) -> Destinations:
         """
         Should be implemented by all subclasses.
         Should return all board destination coordinates that the piece
         could travel to with one move from the given origin coordinate.
-        The destinations should be formatted as a List[List[Coord]].
-        The inner lists should be used to group the destinations that
+        The destinations should be formatted as a tuple of tuples.
+        The inner tuples should be used to group the destinations that
         form an uninterrupted path on the same file, rank or diagonal.
         They should be in order, the ones closer to the origin first.
-        Destinations not in a path, should be in a list by themselves.
+        Destinations not in a path, should be in a tuple by themselves.
+        The returned structures are precomputed and shared between calls,
+        so they are immutable.
         """
         raise Exception("get_destinations not implemented.")
     
@@ -44,16 +77,10 @@ class King(Piece):
         (-1, 0),           (1, 0),
         (-1, -1), (0, -1), (1, -1)
     ]
+    DESTINATIONS = _build_destinations(DESTINATIONS_MAP, sliding=False)
 
-    def get_destinations(self, origin: Coord) -> List[List[Coord]]:
-        destinations = []
-        for file_inc, rank_inc in King.DESTINATIONS_MAP:
-            file = origin.file + file_inc
-            rank = origin.rank + rank_inc
-            if file >= 0 and file < 8 and rank >= 0 and rank < 8:
-                destination = Coord(file, rank)
-                destinations.append([destination])
-        return destinations
+    def get_destinations(self, origin: Coord) -> Destinations:
+        return King.DESTINATIONS[origin.index]
 
     def to_string(self) -> str:
         return "♔" if self.color == PieceColor.WHITE else "♚"
@@ -61,10 +88,15 @@ class King(Piece):
 
 class Queen(Piece):
 
-    def get_destinations(self, origin: Coord) -> List[List[Coord]]:
-        rook_destinations = Rook(self.color).get_destinations(origin)
-        bishop_destinations = Bishop(self.color).get_destinations(origin)
-        return rook_destinations + bishop_destinations
+    # Rook directions followed by bishop directions.
+    DESTINATIONS_MAP = [
+        (0, 1), (1, 0), (0, -1), (-1, 0),
+        (1, 1), (1, -1), (-1, -1), (-1, 1)
+    ]
+    DESTINATIONS = _build_destinations(DESTINATIONS_MAP, sliding=True)
+
+    def get_destinations(self, origin: Coord) -> Destinations:
+        return Queen.DESTINATIONS[origin.index]
 
     def to_string(self) -> str:
         return "♕" if self.color == PieceColor.WHITE else "♛"
@@ -73,24 +105,10 @@ class Queen(Piece):
 class Rook(Piece):
 
     DESTINATIONS_MAP = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+    DESTINATIONS = _build_destinations(DESTINATIONS_MAP, sliding=True)
 
-    def get_destinations(self, origin: Coord) -> List[List[Coord]]:
-        destinations = []
-        for file_inc, rank_inc in Rook.DESTINATIONS_MAP:
-            destination_path = []
-            steps = 1
-            while True:
-                file = origin.file + file_inc * steps
-                rank = origin.rank + rank_inc * steps
-                if file >= 0 and file < 8 and rank >= 0 and rank < 8:
-                    destination = Coord(file, rank)
-                    destination_path.append(destination)
-                    steps += 1
-                else:
-                    break
-            if len(destination_path) > 0:
-                destinations.append(destination_path)
-        return destinations
+    def get_destinations(self, origin: Coord) -> Destinations:
+        return Rook.DESTINATIONS[origin.index]
 
     def to_string(self) -> str:
         return "♖" if self.color == PieceColor.WHITE else "♜"
@@ -99,24 +117,10 @@ class Rook(Piece):
 class Bishop(Piece):
 
     DESTINATIONS_MAP = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+    DESTINATIONS = _build_destinations(DESTINATIONS_MAP, sliding=True)
 
-    def get_destinations(self, origin: Coord) -> List[List[Coord]]:
-        destinations = []
-        for file_inc, rank_inc in Bishop.DESTINATIONS_MAP:
-            destination_path = []
-            steps = 1
-            while True:
-                file = origin.file + file_inc * steps
-                rank = origin.rank + rank_inc * steps
-                if file >= 0 and file < 8 and rank >= 0 and rank < 8:
-                    destination = Coord(file, rank)
-                    destination_path.append(destination)
-                    steps += 1
-                else:
-                    break
-            if len(destination_path) > 0:
-                destinations.append(destination_path)
-        return destinations
+    def get_destinations(self, origin: Coord) -> Destinations:
+        return Bishop.DESTINATIONS[origin.index]
 
     def to_string(self) -> str:
         return "♗" if self.color == PieceColor.WHITE else "♝"
@@ -125,46 +129,49 @@ class Bishop(Piece):
 class Knight(Piece):
 
     DESTINATIONS_MAP = [(-1, 2), (1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1)]
+    DESTINATIONS = _build_destinations(DESTINATIONS_MAP, sliding=False)
 
-    def get_destinations(self, origin: Coord) -> List[List[Coord]]:
-        destinations = []
-        for file_inc, rank_inc in Knight.DESTINATIONS_MAP:
-            file = origin.file + file_inc
-            rank = origin.rank + rank_inc
-            if file >= 0 and file < 8 and rank >= 0 and rank < 8:
-                destination = Coord(file, rank)
-                destinations.append([destination])
-        return destinations
+    def get_destinations(self, origin: Coord) -> Destinations:
+        return Knight.DESTINATIONS[origin.index]
 
     def to_string(self) -> str:
         return "♘" if self.color == PieceColor.WHITE else "♞"
 
 
+def _build_pawn_destinations(color: PieceColor, capture: bool) -> List[Destinations]:
+    rank_inc = 1 if color == PieceColor.WHITE else -1
+    start_rank = 1 if color == PieceColor.WHITE else 6
+    last_rank = 7 if color == PieceColor.WHITE else 0
+    all_destinations = []
+    for index in range(64):
+        file, rank = index % 8, index // 8
+        destinations = []
+        if rank != last_rank:
+            if capture:
+                if file != 0:
+                    destinations.append((Coord(file - 1, rank + rank_inc),))
+                if file != 7:
+                    destinations.append((Coord(file + 1, rank + rank_inc),))
+            else: # not capture
+                destination_path = [Coord(file, rank + rank_inc)]
+                if rank == start_rank:
+                    destination_path.append(Coord(file, rank + rank_inc * 2))
+                destinations.append(tuple(destination_path))
+        all_destinations.append(tuple(destinations))
+    return all_destinations
+
+
 class Pawn(Piece):
 
-    def get_destinations(self, origin: Coord, capture: bool) -> List[List[Coord]]:
-        if (
-            self.color == PieceColor.WHITE and origin.rank == 7 or
-            self.color == PieceColor.BLACK and origin.rank == 0
-        ):
-            return []
-        destinations = []
-        rank_inc = 1 if self.color == PieceColor.WHITE else -1
-        if capture:
-            if origin.file != 0:
-                destinations.append([Coord(origin.file - 1, origin.rank + rank_inc)])
-            if origin.file != 7:
-                destinations.append([Coord(origin.file + 1, origin.rank + rank_inc)])
-        else: # not capture
-            destination_path = []
-            destination_path.append(Coord(origin.file, origin.rank + rank_inc))
-            if (
-                self.color == PieceColor.WHITE and origin.rank == 1 or
-                self.color == PieceColor.BLACK and origin.rank == 6
-            ):
-                    destination_path.append(Coord(origin.file, origin.rank + rank_inc * 2))
-            destinations.append(destination_path)
-        return destinations
+    # Indexed by color and capture mode.
+    DESTINATIONS = {
+        (color, capture): _build_pawn_destinations(color, capture)
+        for color in [PieceColor.WHITE, PieceColor.BLACK]
+        for capture in [False, True]
+    }
+
+    def get_destinations(self, origin: Coord, capture: bool) -> Destinations:
+        return Pawn.DESTINATIONS[(self.color, capture)][origin.index]
 
     def to_string(self) -> str:
         return "♙" if self.color == PieceColor.WHITE else "♟︎"
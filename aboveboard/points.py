@@ -0,0 +1,102 @@
+from aboveboard.piece import King, Queen, Rook, Bishop, Knight, Pawn, PieceColor
+
+
+# Evaluation tables that Board keeps incremental sums of (see eval.py).
+
+MATERIAL_POINTS = {
+    King: 0,
+    Queen: 9,
+    Rook: 5,
+    Bishop: 3,
+    Knight: 3,
+    Pawn: 1
+}
+
+
+KING_POSITION_POINTS = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 1, 2, 2, 1, 0, 0],
+    [0, 0, 1, 2, 2, 1, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 1, 0, 0, 0, 0, 1, 0]
+]
+QUEEN_POSITION_POINTS = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+ROOK_POSITION_POINTS = [
+    [1, 1, 1, 1, 1, 1, 1, 1],
+    [2, 2, 2, 3, 3, 2, 2, 2],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 1, 1, 1, 1, 0, 0],
+    [0, 0, 2, 3, 3, 2, 0, 0]
+]
+BISHOP_POSITION_POINTS = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [1, 0, 1, 0, 0, 1, 0, 1],
+    [0, 2, 1, 1, 1, 1, 2, 0],
+    [2, 1, 2, 1, 1, 2, 1, 2],
+    [1, 2, 1, 1, 1, 1, 2, 1],
+    [1, 3, 0, 1, 1, 0, 3, 1],
+    [1, 0, 1, 0, 0, 1, 0, 1]
+]
+KNIGHT_POSITION_POINTS = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 1, 2, 2, 2, 2, 1, 0],
+    [0, 2, 2, 2, 2, 2, 2, 0],
+    [0, 1, 2, 2, 2, 2, 1, 0],
+    [0, 1, 2, 1, 1, 2, 1, 0],
+    [0, 0, 0, 1, 1, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+PAWN_POSITION_POINTS = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [3, 3, 3, 3, 3, 3, 3, 3],
+    [2, 2, 2, 2, 2, 2, 2, 2],
+    [1, 1, 1, 1, 1, 1, 1, 1],
+    [0, 0, 0, 3, 3, 0, 0, 0],
+    [0, 1, 0, 1, 1, 0, 1, 0],
+    [1, 1, 1, 0, 0, 1, 1, 1],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
+
+def _build_position_points(table: list, color: PieceColor) -> list:
+    # Tables are indexed by [row][file], where row 0 is
+    # rank 1 for black pieces and rank 8 for white pieces.
+    points = []
+    for index in range(64):
+        file, rank = index % 8, index // 8
+        if color == PieceColor.WHITE:
+            rank = 7 - rank
+        points.append(table[rank][file])
+    return points
+
+
+# Position points of each piece type and color, indexed by square.
+POSITION_POINTS = {
+    (piece_type, color): _build_position_points(table, color)
+    for piece_type, table in [
+        (King, KING_POSITION_POINTS),
+        (Queen, QUEEN_POSITION_POINTS),
+        (Rook, ROOK_POSITION_POINTS),
+        (Bishop, BISHOP_POSITION_POINTS),
+        (Knight, KNIGHT_POSITION_POINTS),
+        (Pawn, PAWN_POSITION_POINTS)
+    ]
+    for color in [PieceColor.WHITE, PieceColor.BLACK]
+}
@@ -0,0 +1,271 @@
+from aboveboard.bitboard import KING_ATTACKS, get_piece_attacks, iterate_bits, square_index
+from aboveboard.coord import Coord
+from aboveboard.game import Game
+from aboveboard.move import Move
+from aboveboard.piece import King, Queen, Rook, PieceColor
+from typing import Callable, Tuple
+import mmap
+import os
+import time
+
+
+# Material signatures with tablebases: the piece of the strong side
+# (either color) against a lone king. Pawnless, so they are symmetric.
+TABLEBASE_PIECES = {
+    "KQK": Queen,
+    "KRK": Rook
+}
+TABLEBASE_EXTENSION = ".tb"
+
+
+def _build_square_transforms() -> list:
+    # The 8 symmetries of the board: identity, mirrors and rotations.
+    transforms = []
+    for transpose in [False, True]:
+        for flip_rank in [False, True]:
+            for flip_file in [False, True]:
+                squares = []
+                for index in range(64):
+                    file, rank = index % 8, index // 8
+                    if flip_file:
+                        file = 7 - file
+                    if flip_rank:
+                        rank = 7 - rank
+                    if transpose:
+                        file, rank = rank, file
+                    squares.append(square_index(file, rank))
+                transforms.append(squares)
+    return transforms
+
+
+SQUARE_TRANSFORMS = _build_square_transforms()
+# Every position has a symmetric one with the strong king in the a1-d1-d4 triangle,
+# so only those are stored: the first transform that takes the king there is used.
+TRIANGLE_SQUARES = [square_index(file, rank) for file in range(4) for rank in range(file + 1)]
+TRIANGLE_INDEXES = {index: triangle_index for triangle_index, index in enumerate(TRIANGLE_SQUARES)}
+TRIANGLE_MASK = sum(1 << index for index in TRIANGLE_SQUARES)
+KING_TRANSFORMS = [
+    next(t for t, squares in enumerate(SQUARE_TRANSFORMS) if squares[index] in TRIANGLE_INDEXES)
+    for index in range(64)
+]
+# One byte per position: the side to move (strong or weak), strong king (in the triangle),
+# strong piece and weak king. The value is 0 for draws (and illegal positions), or the
+# number of plies to mate plus 1. Even numbers of plies are losses of the side to move.
+TABLEBASE_SIZE = 2 * len(TRIANGLE_SQUARES) * 64 * 64
+STRONG_TO_MOVE, WEAK_TO_MOVE = 0, 1
+
+
+def _get_index(side_to_move: int, strong_king: int, piece: int, weak_king: int) -> int:
+    # The strong king must be in the triangle.
+    return ((side_to_move * len(TRIANGLE_SQUARES) + TRIANGLE_INDEXES[strong_king]) * 64 + piece) * 64 + weak_king
+
+
+def _get_canonical_index(side_to_move: int, strong_king: int, piece: int, weak_king: int) -> int:
+    squares = SQUARE_TRANSFORMS[KING_TRANSFORMS[strong_king]]
+    return _get_index(side_to_move, squares[strong_king], squares[piece], squares[weak_king])
+
+
+def _get_squares(index: int) -> Tuple[int, int, int, int]:
+    index, weak_king = divmod(index, 64)
+    index, piece = divmod(index, 64)
+    side_to_move, triangle_index = divmod(index, len(TRIANGLE_SQUARES))
+    return side_to_move, TRIANGLE_SQUARES[triangle_index], piece, weak_king
+
+
+def generate_tablebase(
+    signature: str,
+    path: str,
+    progress_callback: Callable[[int, int], None]|None = None
+) -> dict:
+    """
+    Writes the tablebase of a signature of TABLEBASE_PIECES to path, by
+    retrograde analysis: starting from the checkmates, the positions where
+    the strong side can move to a loss are wins in one more ply, and the ones
+    where all the moves of the weak side lead to wins are losses in one more.
+    Calls progress_callback with the plies to mate and the positions
+    solved so far after each step. Returns the numbers of positions,
+    wins, losses and draws, the longest mate, the time taken and the
+    positions solved per second.
+    """
+    start_time = time.monotonic()
+    piece_type = TABLEBASE_PIECES[signature]
+    # Squares attacked by the strong piece given the square of the strong king,
+    # looking through the weak king (it can not step back along a check).
+    piece_attacks = [
+        [get_piece_attacks(piece_type, PieceColor.WHITE, piece, (1 << piece) | (1 << strong_king)) for strong_king in range(64)]
+        for piece in range(64)
+    ]
+    values = bytearray(TABLEBASE_SIZE)
+    legal = bytearray(TABLEBASE_SIZE)
+    # Moves of the weak side not known to lose yet, or -1 if the position can
+    # not be lost (illegal, stalemate or capture of the strong piece) or is solved.
+    moves_left = [-1] * TABLEBASE_SIZE
+    positions = 0
+    frontier = []
+    for index in range(TABLEBASE_SIZE):
+        side_to_move, strong_king, piece, weak_king = _get_squares(index)
+        if (
+            piece == strong_king or weak_king == strong_king or weak_king == piece or
+            KING_ATTACKS[strong_king] >> weak_king & 1
+        ):
+            continue
+        in_check = piece_attacks[piece][strong_king] >> weak_king & 1
+        if side_to_move == STRONG_TO_MOVE:
+            if not in_check:
+                legal[index] = 1
+                positions += 1
+            continue
+        legal[index] = 1
+        positions += 1
+        destinations = KING_ATTACKS[weak_king] & ~KING_ATTACKS[strong_king] & ~piece_attacks[piece][strong_king]
+        if destinations >> piece & 1:
+            continue
+        if destinations:
+            moves_left[index] = destinations.bit_count()
+        elif in_check:
+            values[index] = 1
+            frontier.append(index)
+    solved = len(frontier)
+    plies = 0
+    if progress_callback is not None:
+        progress_callback(plies, solved)
+    while frontier:
+        # Positions of the strong side that can move to the losses.
+        wins = []
+        for index in frontier:
+            for strong_king, piece, weak_king in _get_symmetric_squares(index):
+                occupancy = (1 << strong_king) | (1 << piece) | (1 << weak_king)
+                predecessors = []
+                if strong_king in TRIANGLE_INDEXES:
+                    origins = get_piece_attacks(piece_type, PieceColor.WHITE, piece, occupancy) & ~occupancy
+                    predecessors += [_get_index(STRONG_TO_MOVE, strong_king, origin, weak_king) for origin in iterate_bits(origins)]
+                origins = KING_ATTACKS[strong_king] & TRIANGLE_MASK & ~occupancy
+                predecessors += [_get_index(STRONG_TO_MOVE, origin, piece, weak_king) for origin in iterate_bits(origins)]
+                for predecessor in predecessors:
+                    if legal[predecessor] and values[predecessor] == 0:
+                        values[predecessor] = plies + 2
+                        wins.append(predecessor)
+        # Positions of the weak side whose last move not known to lose leads to the wins.
+        frontier = []
+        for index in wins:
+            for strong_king, piece, weak_king in _get_symmetric_squares(index):
+                if strong_king not in TRIANGLE_INDEXES:
+                    continue
+                occupancy = (1 << strong_king) | (1 << piece) | (1 << weak_king)
+                for origin in iterate_bits(KING_ATTACKS[weak_king] & ~occupancy):
+                    predecessor = _get_index(WEAK_TO_MOVE, strong_king, piece, origin)
+                    if moves_left[predecessor] > 0:
+                        moves_left[predecessor] -= 1
+                        if moves_left[predecessor] == 0:
+                            values[predecessor] = plies + 3
+                            frontier.append(predecessor)
+        plies += 2
+        solved += len(wins) + len(frontier)
+        if progress_callback is not None:
+            progress_callback(plies, solved)
+    with open(path, "wb") as tablebase_file:
+        tablebase_file.write(values)
+    total_time = time.monotonic() - start_time
+    wins = sum(1 for value in values if value and value % 2 == 0)
+    losses = sum(1 for value in values if value % 2 == 1)
+    return {
+        "signature": signature,
+        "positions": positions,
+        "wins": wins,
+        "losses": losses,
+        "draws": positions - wins - losses,
+        "max_plies": max(values) - 1,
+        "time": total_time,
+        "positions_per_second": positions / total_time if total_time > 0 else 0.0
+    }
+
+
+def _get_symmetric_squares(index: int) -> list:
+    # Positions (strong king, piece and weak king squares) stored in an entry: the symmetric
+    # ones that are not stored in another entry. Their predecessors are searched separately.
+    side_to_move, strong_king, piece, weak_king = _get_squares(index)
+    positions = {
+        (squares[strong_king], squares[piece], squares[weak_king])
+        for squares in SQUARE_TRANSFORMS
+    }
+    return [position for position in positions if _get_canonical_index(side_to_move, *position) == index]
+
+
+class Tablebases:
+    """
+    Tablebase files generated by generate_tablebase, found in a directory
+    (named after their signatures), probed through mmap.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._files = {}
+        self._maps = {}
+        for signature in TABLEBASE_PIECES:
+            path = os.path.join(directory, signature + TABLEBASE_EXTENSION)
+            if not os.path.exists(path):
+                continue
+            tablebase_file = open(path, "rb")
+            if tablebase_file.seek(0, 2) != TABLEBASE_SIZE:
+                tablebase_file.close()
+                raise Exception(f"Invalid tablebase file {path}.")
+            self._files[signature] = tablebase_file
+            self._maps[signature] = mmap.mmap(tablebase_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        for tablebase_map in self._maps.values():
+            tablebase_map.close()
+        for tablebase_file in self._files.values():
+            tablebase_file.close()
+        self._maps = {}
+        self._files = {}
+
+    def probe(self, game: Game) -> Tuple[int, int]|None:
+        """
+        Returns the result of the current position of the game for the side
+        to move (1 win, 0 draw or -1 loss) and the number of plies to mate
+        (0 for draws), or None if it has no tablebase. Repetitions and
+        the 50-move rule are ignored.
+        """
+        board = game.board
+        occupancy = board.get_occupancy()
+        if occupancy.bit_count() != 3 or game.get_castling_rights():
+            return None
+        kings = board.get_bitboard(King, PieceColor.WHITE) | board.get_bitboard(King, PieceColor.BLACK)
+        piece_index = (occupancy & ~kings).bit_length() - 1
+        piece = board.get_piece_at(Coord.from_index(piece_index))
+        signature = next((s for s, t in TABLEBASE_PIECES.items() if t == type(piece)), None)
+        if signature not in self._maps:
+            return None
+        strong_color = piece.color
+        weak_color = PieceColor.BLACK if strong_color == PieceColor.WHITE else PieceColor.WHITE
+        index = _get_canonical_index(
+            STRONG_TO_MOVE if game.turn == strong_color else WEAK_TO_MOVE,
+            board.get_bitboard(King, strong_color).bit_length() - 1,
+            piece_index,
+            board.get_bitboard(King, weak_color).bit_length() - 1
+        )
+        value = self._maps[signature][index]
+        if value == 0:
+            return 0, 0
+        plies = value - 1
+        return (1 if plies % 2 == 1 else -1), plies
+
+    def choose_move(self, game: Game) -> Move|None:
+        """
+        Returns the best legal move of the current position of the game
+        according to the tablebases, or None if it has no tablebase:
+        the fastest mate when winning, and the slowest one when losing.
+        """
+        if self.probe(game) is None:
+            return None
+        best_move, best_key = None, None
+        for move in game.legal_moves():
+            game.apply_move(move, skip_legal_moves=True)
+            # Captures of the strong piece leave no tablebase: a draw.
+            result, plies = self.probe(game) or (0, 0)
+            game.unapply_last_move()
+            key = (-result, plies if result == 1 else -plies)
+            if best_key is None or key > best_key:
+                best_move, best_key = move, key
+        return best_move
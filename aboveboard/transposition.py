@@ -0,0 +1,184 @@
+from aboveboard.move import Move
+from enum import Enum
+from multiprocessing import shared_memory
+from typing import NamedTuple
+import os
+import struct
+import sys
+import weakref
+
+
+class BoundType(Enum):
+    EXACT = 1
+    LOWER = 2
+    UPPER = 3
+
+
+class TranspositionEntry(NamedTuple):
+    key: int
+    depth: int
+    score: float
+    bound: BoundType
+    best_move: Move|None
+
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of search results, keyed by position hash.
+    Each bucket has 2 slots: a depth-preferred slot, that is only replaced
+    by results searched at least as deep (or of the same position),
+    and an always-replace slot, that gets everything else.
+    """
+
+    # Approximate memory taken by one entry (slot pointer, tuple and its fields).
+    ENTRY_SIZE = 160
+
+    def __init__(self, size_mb: float = 16):
+        size = int(size_mb * 1024 * 1024)
+        self.bucket_count = max(1, size // (2 * TranspositionTable.ENTRY_SIZE))
+        self._entries = [None] * (self.bucket_count * 2)
+
+    def probe(self, key: int) -> TranspositionEntry|None:
+        index = (key % self.bucket_count) * 2
+        entry = self._entries[index]
+        if entry is not None and entry.key == key:
+            return entry
+        entry = self._entries[index + 1]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(
+        self,
+        key: int,
+        depth: int,
+        score: float,
+        bound: BoundType,
+        best_move: Move|None
+    ) -> None:
+        index = (key % self.bucket_count) * 2
+        entry = TranspositionEntry(key, depth, score, bound, best_move)
+        depth_preferred_entry = self._entries[index]
+        if depth_preferred_entry is None or depth_preferred_entry.key == key:
+            self._entries[index] = entry
+        elif depth >= depth_preferred_entry.depth:
+            # The replaced entry gets a second chance in the always-replace slot.
+            self._entries[index] = entry
+            self._entries[index + 1] = depth_preferred_entry
+        else:
+            self._entries[index + 1] = entry
+
+    def clear(self) -> None:
+        self._entries = [None] * (self.bucket_count * 2)
+
+
+class SharedTranspositionTable:
+    """
+    TranspositionTable stored in shared memory, so that it can be used by
+    several processes at once. It has the same interface and replacement
+    scheme. Each entry is packed in 3 words: the key xor-ed with the data
+    words, the score and the rest of the data (depth, bound and best move
+    code). Accesses are not locked: an entry torn by concurrent writes
+    does not match its key anymore, so it is just a miss.
+    """
+
+    ENTRY_FORMAT = struct.Struct("<QQQ")
+    SCORE_FORMAT = struct.Struct("<d")
+
+    def __init__(self, size_mb: float = 16):
+        size = int(size_mb * 1024 * 1024)
+        self.bucket_count = max(1, size // (2 * SharedTranspositionTable.ENTRY_FORMAT.size))
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=self.bucket_count * 2 * SharedTranspositionTable.ENTRY_FORMAT.size
+        )
+        # The creator process unlinks the memory when the table is collected.
+        weakref.finalize(self, _release_shared_memory, self._memory, os.getpid())
+
+    @classmethod
+    def _attach(cls, name: str, bucket_count: int):
+        table = object.__new__(cls)
+        table.bucket_count = bucket_count
+        if sys.version_info >= (3, 13):
+            # Otherwise the resource tracker unlinks the memory when the attached process exits.
+            table._memory = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            table._memory = shared_memory.SharedMemory(name=name)
+        return table
+
+    def __reduce__(self):
+        # Unpickled tables (in other processes) attach to the same memory.
+        return (SharedTranspositionTable._attach, (self._memory.name, self.bucket_count))
+
+    def probe(self, key: int) -> TranspositionEntry|None:
+        index = (key % self.bucket_count) * 2
+        entry = self._read_entry(index)
+        if entry is not None and entry.key == key:
+            return entry
+        entry = self._read_entry(index + 1)
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(
+        self,
+        key: int,
+        depth: int,
+        score: float,
+        bound: BoundType,
+        best_move: Move|None
+    ) -> None:
+        index = (key % self.bucket_count) * 2
+        depth_preferred_entry = self._read_entry(index)
+        if depth_preferred_entry is None or depth_preferred_entry.key == key:
+            self._write_entry(index, key, depth, score, bound, best_move)
+        elif depth >= depth_preferred_entry.depth:
+            # The replaced entry gets a second chance in the always-replace slot.
+            self._write_entry(index, key, depth, score, bound, best_move)
+            self._write_entry(index + 1, *depth_preferred_entry)
+        else:
+            self._write_entry(index + 1, key, depth, score, bound, best_move)
+
+    def clear(self) -> None:
+        self._memory.buf[:] = bytes(len(self._memory.buf))
+
+    def _read_entry(self, index: int) -> TranspositionEntry|None:
+        check, score_bits, data = SharedTranspositionTable.ENTRY_FORMAT.unpack_from(
+            self._memory.buf, index * SharedTranspositionTable.ENTRY_FORMAT.size
+        )
+        if data == 0:
+            return None
+        score, = SharedTranspositionTable.SCORE_FORMAT.unpack(score_bits.to_bytes(8, "little"))
+        move_code = data >> 16
+        return TranspositionEntry(
+            check ^ score_bits ^ data,
+            data & 0xff,
+            score,
+            BoundType((data >> 8) & 0xff),
+            Move.from_code(move_code) if move_code != 0 else None
+        )
+
+    def _write_entry(
+        self,
+        index: int,
+        key: int,
+        depth: int,
+        score: float,
+        bound: BoundType,
+        best_move: Move|None
+    ) -> None:
+        score_bits = int.from_bytes(SharedTranspositionTable.SCORE_FORMAT.pack(score), "little")
+        move_code = best_move.to_code() if best_move is not None else 0
+        data = (move_code << 16) | (bound.value << 8) | min(depth, 0xff)
+        SharedTranspositionTable.ENTRY_FORMAT.pack_into(
+            self._memory.buf,
+            index * SharedTranspositionTable.ENTRY_FORMAT.size,
+            key ^ score_bits ^ data,
+            score_bits,
+            data
+        )
+
+
+def _release_shared_memory(memory: shared_memory.SharedMemory, creator_pid: int) -> None:
+    memory.close()
+    if os.getpid() == creator_pid:
+        memory.unlink()
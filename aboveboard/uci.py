@@ -0,0 +1,327 @@
+from aboveboard.engine import Engine
+from aboveboard.eval import MATERIAL_WEIGHT
+from aboveboard.game import Game, STARTING_FEN
+from aboveboard.move import Move, Promotion, PromotionCapture, Castling
+from aboveboard.piece import Pawn, PieceColor
+from aboveboard.points import MATERIAL_POINTS
+from typing import Callable, Dict, List
+import threading
+import time
+
+
+def format_uci_move(game: Game, move: Move) -> str:
+    """
+    Returns the UCI notation of a move of the game: origin and destination
+    squares, plus the lowercase promotion piece. Castlings are king moves.
+    """
+    if type(move) == Castling:
+        coords = game.get_castling_coords(move.mode)
+        return coords["king_origin"].to_string() + coords["king_destination"].to_string()
+    notation = move.origin.to_string() + move.destination.to_string()
+    if type(move) in [Promotion, PromotionCapture]:
+        reverse_promote_code_map = {v: k for k, v in Promotion.PROMOTE_CODE_MAP.items()}
+        notation += reverse_promote_code_map[move.promote_to].lower()
+    return notation
+
+
+def parse_uci_move(game: Game, notation: str) -> Move:
+    """
+    Returns the legal move of the game with the given UCI notation.
+    """
+    for move in game.legal_moves():
+        if format_uci_move(game, move) == notation:
+            return move
+    raise Exception(f"{notation} is not a legal move.")
+
+
+class UCI:
+    """
+    Universal Chess Interface front-end for Engine. Commands are passed
+    to handle one line at a time, and responses are written with output.
+    Searches run in a background thread, so that stop and ponderhit can
+    be handled while searching. The same engine (and its transposition
+    table and evaluation cache) is kept between searches, until the
+    options change.
+    """
+
+    NAME = "Aboveboard"
+    AUTHOR = "the Aboveboard authors"
+    # Maximum depth (in plies) of searches limited by time, or not limited at all.
+    # UCI depths count the root move, so they are min_max_depth + 1.
+    MAX_DEPTH = 64
+
+    def __init__(self, output: Callable[[str], None] = print):
+        self.output = output
+        self.options = {"Hash": 16, "Threads": 1, "Ponder": False, "BookFile": "", "TablebasePath": ""}
+        self.engine = None
+        self.game = Game()
+        self._search_thread = None
+        self._search_game = None
+        self._go_params = None
+        self._pondering = False
+        self._infinite = False
+        # Best move (and ponder move) of a finished search not sent yet.
+        self._result = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def _get_engine(self) -> Engine:
+        if self.engine is None:
+            self.engine = Engine(
+                UCI.MAX_DEPTH - 1,
+                transposition_table_mb=self.options["Hash"],
+                workers=self.options["Threads"],
+                lazy_smp=True,
+                opening_book=self.options["BookFile"] or None,
+                tablebases=self.options["TablebasePath"] or None
+            )
+        return self.engine
+
+    def handle(self, line: str) -> bool:
+        """
+        Handles a command line. Returns False after the quit command.
+        Unknown commands are ignored, as the protocol requires, and
+        invalid ones are reported in an info string.
+        """
+        try:
+            return self._handle(line)
+        except Exception as e:
+            self.output(f"info string {e}")
+            return True
+
+    def _handle(self, line: str) -> bool:
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.output(f"id name {UCI.NAME}")
+            self.output(f"id author {UCI.AUTHOR}")
+            self.output("option name Hash type spin default 16 min 1 max 4096")
+            self.output("option name Threads type spin default 1 min 1 max 64")
+            self.output("option name Ponder type check default false")
+            self.output("option name BookFile type string default <empty>")
+            self.output("option name TablebasePath type string default <empty>")
+            self.output("uciok")
+        elif command == "isready":
+            # The worker processes are started now, not in the time of the next search.
+            self._get_engine().start_workers()
+            self.output("readyok")
+        elif command == "setoption":
+            self._set_option(args)
+        elif command == "ucinewgame":
+            self._stop_search()
+            if self.engine is not None:
+                self.engine.transposition_table.clear()
+                self.engine.evaluation_cache.clear()
+            self.game = Game()
+        elif command == "position":
+            self._stop_search()
+            self._set_position(args)
+        elif command == "go":
+            self._stop_search()
+            self._go(args)
+        elif command == "stop":
+            self._stop_search()
+        elif command == "ponderhit":
+            self._ponderhit()
+        elif command == "quit":
+            self._stop_search()
+            if self.engine is not None:
+                self.engine.close()
+            return False
+        return True
+
+    def _set_option(self, args: List[str]) -> None:
+        if "name" not in args:
+            return
+        value_index = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:value_index])
+        value = " ".join(args[value_index + 1:])
+        if name not in self.options:
+            return
+        self._stop_search()
+        if name == "Ponder":
+            self.options[name] = value.lower() == "true"
+            return
+        if name in ["BookFile", "TablebasePath"]:
+            self.options[name] = "" if value == "<empty>" else value
+        else:
+            self.options[name] = max(1, int(value))
+        # The engine is created again, with the new options, when needed.
+        if self.engine is not None:
+            self.engine.close()
+            self.engine = None
+
+    def _set_position(self, args: List[str]) -> None:
+        moves_index = args.index("moves") if "moves" in args else len(args)
+        if args and args[0] == "fen":
+            game = Game.from_fen(" ".join(args[1:moves_index]))
+        else: # startpos
+            game = Game.from_fen(STARTING_FEN)
+        for notation in args[moves_index + 1:]:
+            game.apply_move(parse_uci_move(game, notation), skip_legal_moves=True)
+        self.game = game
+
+    def _go(self, args: List[str]) -> None:
+        params = {}
+        index = 0
+        while index < len(args):
+            if args[index] in ["ponder", "infinite"]:
+                params[args[index]] = True
+                index += 1
+            elif args[index] == "searchmoves":
+                # Not supported: all the moves are searched.
+                index = len(args)
+            else:
+                if index + 1 < len(args):
+                    params[args[index]] = int(args[index + 1])
+                index += 2
+        engine = self._get_engine()
+        engine.min_max_depth = max(params.get("depth", UCI.MAX_DEPTH), 1) - 1
+        self._go_params = params
+        self._pondering = params.get("ponder", False)
+        self._infinite = params.get("infinite", False)
+        self._result = None
+        if self._pondering or params.get("infinite", False):
+            # Searches until stop (or ponderhit, that sets the time budget).
+            time_budget = {"move_time": float("inf")}
+        else:
+            time_budget = self._get_time_budget(params)
+        self._search_game = self.game
+        # Stops from now on are for this search, even before it starts.
+        engine.reset_stop()
+        self._search_thread = threading.Thread(
+            target=self._search, args=(self._search_game, time_budget)
+        )
+        self._search_thread.start()
+
+    def _get_time_budget(self, params: Dict[str, int]) -> Dict[str, float]:
+        # Searches without time limits are deepened iteratively too,
+        # so that they can be stopped with a move.
+        white_turn = self.game.turn == PieceColor.WHITE
+        remaining_time = params.get("wtime" if white_turn else "btime")
+        if "movetime" not in params and remaining_time is None:
+            return {"move_time": float("inf")}
+        return {
+            "move_time": params["movetime"] / 1000 if "movetime" in params else None,
+            "remaining_time": remaining_time / 1000 if remaining_time is not None else None,
+            "increment": params.get("winc" if white_turn else "binc", 0) / 1000
+        }
+
+    def _search(self, game: Game, time_budget: Dict[str, float]) -> None:
+        engine = self.engine
+        start_time = time.monotonic()
+        best_move = engine.get_best_move(
+            game,
+            iteration_callback=lambda depth, move, score: self._output_iteration(game, start_time, depth, score),
+            **time_budget
+        )
+        ponder_move = engine.get_ponder_move(game, best_move) if best_move is not None else None
+        with self._lock:
+            self._result = (game, best_move, ponder_move)
+            # While pondering, the best move is only sent after stop or ponderhit,
+            # and in infinite searches, after stop.
+            if not self._pondering and not self._infinite:
+                self._send_result()
+
+    def _output_iteration(self, game: Game, start_time: float, depth: int, score: float) -> None:
+        # Sent after each completed iteration, so that searches until stop report their progress.
+        engine = self.engine
+        search_time = time.monotonic() - start_time
+        nodes = engine.nodes + engine.quiescence_nodes
+        principal_variation = engine.get_principal_variation()
+        self.output(
+            f"info depth {depth + 1} score {self._format_score(game, score, depth, principal_variation)} "
+            f"nodes {nodes} time {round(search_time * 1000)} "
+            f"nps {round(nodes / search_time) if search_time > 0 else 0}"
+            + (f" pv {self._format_line(game, principal_variation)}" if principal_variation else "")
+        )
+
+    def _send_result(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        game, best_move, ponder_move = self._result
+        self._result = None
+        if best_move is None:
+            self.output("bestmove 0000")
+        elif ponder_move is not None:
+            self.output(
+                f"bestmove {format_uci_move(game, best_move)} ponder "
+                f"{self._format_reply(game, best_move, ponder_move)}"
+            )
+        else:
+            self.output(f"bestmove {format_uci_move(game, best_move)}")
+
+    def _format_reply(self, game: Game, move: Move, reply: Move) -> str:
+        game.apply_move(move, skip_legal_moves=True)
+        notation = format_uci_move(game, reply)
+        game.unapply_last_move()
+        return notation
+
+    def _format_score(self, game: Game, score: float, depth: int, principal_variation: List[Move]) -> str:
+        # Scores are in [-1, 1] from white's point of view, and UCI ones from the
+        # side to move's. Checkmates score 1 (or -1): they are sent in moves, as
+        # many as the line takes to get to it, or the search to see it if the
+        # line is cut short. Tablebase wins score the same, but with no line to
+        # count, they are sent in centipawns, like the rest of scores.
+        if game.turn == PieceColor.BLACK:
+            score = -score
+        if abs(score) == 1.0:
+            for move in principal_variation:
+                game.apply_move(move, skip_legal_moves=True)
+            checkmate = game.is_finished() and game.winner() is not None
+            for _ in principal_variation:
+                game.unapply_last_move()
+            if checkmate or self.engine.tablebases is None:
+                plies = len(principal_variation) if checkmate else depth + 1
+                return f"mate {(plies + 1) // 2 if score > 0 else -(plies // 2)}"
+        # The material score is the share of the material, so a pawn is worth
+        # less of it the more material is left (see eval_material).
+        board = game.board
+        total_points = board.get_material_points(PieceColor.WHITE) + board.get_material_points(PieceColor.BLACK)
+        return f"cp {round(score * total_points / (MATERIAL_WEIGHT * MATERIAL_POINTS[Pawn]) * 100)}"
+
+    def _format_line(self, game: Game, moves: List[Move]) -> str:
+        notations = []
+        for move in moves:
+            notations.append(format_uci_move(game, move))
+            game.apply_move(move, skip_legal_moves=True)
+        for _ in moves:
+            game.unapply_last_move()
+        return " ".join(notations)
+
+    def _ponderhit(self) -> None:
+        with self._lock:
+            if not self._pondering:
+                return
+            self._pondering = False
+            if self._result is not None:
+                self._send_result()
+                return
+            # The ponder search goes on, now with the time budget of the go command.
+            # The budget counts from now, as the clock times were sent with it.
+            self._go_params.pop("ponder")
+            time_budget = self._get_time_budget(self._go_params)
+            if time_budget["move_time"] == float("inf"):
+                return
+            time_limit = self.engine.get_time_limit(**time_budget)
+            self._timer = threading.Timer(time_limit, self.engine.stop)
+            self._timer.start()
+
+    def _stop_search(self) -> None:
+        if self._search_thread is None:
+            return
+        with self._lock:
+            self._pondering = False
+            self._infinite = False
+            if self._result is not None:
+                self._send_result()
+        self.engine.stop()
+        self._search_thread.join()
+        self._search_thread = None
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
@@ -0,0 +1,31 @@
+from aboveboard.piece import King, Queen, Rook, Bishop, Knight, Pawn, PieceColor
+from random import Random
+
+
+# Keys are generated from a fixed seed, so that hashes are stable
+# across runs and processes (they can be stored in files).
+_random = Random(20240229)
+
+PIECE_KEYS = {
+    (piece_type, color): [_random.getrandbits(64) for index in range(64)]
+    for piece_type in [King, Queen, Rook, Bishop, Knight, Pawn]
+    for color in [PieceColor.WHITE, PieceColor.BLACK]
+}
+BLACK_TURN_KEY = _random.getrandbits(64)
+_CASTLING_RIGHT_KEYS = [_random.getrandbits(64) for right in range(4)]
+EN_PASSANT_KEYS = [_random.getrandbits(64) for file in range(8)]
+
+
+def _build_castling_keys() -> list:
+    # One key per combination of the 4 castling rights bits.
+    keys = []
+    for rights in range(16):
+        key = 0
+        for right in range(4):
+            if rights & (1 << right):
+                key ^= _CASTLING_RIGHT_KEYS[right]
+        keys.append(key)
+    return keys
+
+
+CASTLING_KEYS = _build_castling_keys()